@@ -16,11 +16,12 @@ if os.getenv("WEBSITE_SITE_NAME") is None:
         )  # Assumes .env is in project root
         load_dotenv(dotenv_path=dotenv_path, override=True)
     except ImportError:
-        print(
-            "python-dotenv not found or .env file missing, skipping load_dotenv(). Relying on system environment variables."
+        logging.warning(
+            "python-dotenv not found or .env file missing, skipping load_dotenv(). "
+            "Relying on system environment variables."
         )
     except Exception as e:
-        print(f"Error loading .env file: {e}")
+        logging.warning("Error loading .env file: %s", e)
 
 
 class Settings:
@@ -64,8 +65,10 @@ def configure_logging():
 
     warnings.filterwarnings("ignore", category=CryptographyDeprecationWarning)
 
+    # LOG_LEVEL=WARNING in production silences the per-request INFO lines
+    # (and the string formatting behind them) without a code change.
     logging.basicConfig(
-        level=logging.INFO,
+        level=getattr(logging, os.getenv("LOG_LEVEL", "INFO").upper(), logging.INFO),
         format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
         stream=sys.stdout,
     )
@@ -1,6 +1,7 @@
 # app/core/database.py
 
 from sqlmodel import SQLModel, create_engine
+from sqlalchemy import inspect
 from typing import Generator
 import os
 from dotenv import load_dotenv
@@ -15,17 +16,64 @@ DATABASE_URL = os.getenv(
     "DATABASE_URL", "sqlite:///./pdf_assistant.db"  # Default SQLite database file
 )
 
-# Create database engine
+# Create database engine. The pool is sized for bursts of concurrent
+# webhook handlers, and pre-ping drops stale connections (relevant once
+# DATABASE_URL points at a networked database) before a handler uses one.
 engine = create_engine(
     DATABASE_URL,
     echo=False,  # Set to True to see SQL queries
     connect_args={"check_same_thread": False},  # Needed for SQLite
+    pool_size=10,
+    max_overflow=20,
+    pool_pre_ping=True,
 )
 
 
 def init_db() -> None:
     """Initialize the database, creating all tables."""
     SQLModel.metadata.create_all(engine)
+    _run_schema_migrations(engine)
+
+
+def _run_schema_migrations(db_engine) -> None:
+    """Bring databases created before recent model changes up to date.
+
+    create_all only creates missing tables — it never alters existing ones —
+    so additive schema changes must be applied here for existing databases:
+
+    * ``pdfdocument.content_hash`` (indexed), used to skip re-processing
+      duplicate uploads.
+    * the unique index on ``userstate.user_id``, the conflict target of the
+      ``_set_user_state`` UPSERT. Pre-existing duplicate rows are collapsed
+      to the newest one per user before the index is created.
+    """
+    inspector = inspect(db_engine)
+    tables = set(inspector.get_table_names())
+    with db_engine.begin() as conn:
+        if "pdfdocument" in tables:
+            columns = {c["name"] for c in inspector.get_columns("pdfdocument")}
+            if "content_hash" not in columns:
+                conn.exec_driver_sql(
+                    "ALTER TABLE pdfdocument ADD COLUMN content_hash VARCHAR"
+                )
+                conn.exec_driver_sql(
+                    "CREATE INDEX IF NOT EXISTS ix_pdfdocument_content_hash "
+                    "ON pdfdocument (content_hash)"
+                )
+        if "userstate" in tables:
+            has_unique_user_id = any(
+                index["unique"] and index["column_names"] == ["user_id"]
+                for index in inspector.get_indexes("userstate")
+            )
+            if not has_unique_user_id:
+                conn.exec_driver_sql(
+                    "DELETE FROM userstate WHERE id NOT IN "
+                    "(SELECT MAX(id) FROM userstate GROUP BY user_id)"
+                )
+                conn.exec_driver_sql(
+                    "CREATE UNIQUE INDEX IF NOT EXISTS ix_userstate_user_id "
+                    "ON userstate (user_id)"
+                )
 
 
 def get_db() -> Generator:
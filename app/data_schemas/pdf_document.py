@@ -1,15 +1,24 @@
 # app/data_schemas/pdf_document.py
 
+from sqlalchemy import Index
 from sqlmodel import SQLModel, Field
 from datetime import datetime
 from typing import Optional
 
 
 class PDFDocument(SQLModel, table=True):
+    # Every message from a user with an active document runs a
+    # user_id + upload_date ordered lookup; the composite index turns that
+    # from a table scan into an index seek.
+    __table_args__ = (Index("ix_pdf_user_date", "user_id", "upload_date"),)
+
     id: int = Field(default=None, primary_key=True)
     filename: str
     content: str = ""  # Empty initially, will be filled after processing
     upload_date: datetime = Field(default_factory=datetime.utcnow)
     user_id: str  # WhatsApp user ID
+    # blake2b digest of the raw bytes; lets re-uploads of the same file
+    # skip extraction and re-indexing entirely.
+    content_hash: Optional[str] = Field(default=None, index=True)
     whatsapp_file_id: Optional[str] = Field(default=None)
     processed: bool = Field(default=False)  # Track processing status
@@ -34,7 +34,9 @@ class UserState(SQLModel, table=True):
     """Store user state for multi-step interactions"""
 
     id: int = Field(default=None, primary_key=True)
-    user_id: str = Field(index=True)
+    # Unique: one state row per user, and the conflict target for the
+    # UPSERT in WebhookService._set_user_state.
+    user_id: str = Field(index=True, unique=True)
     state: str  # "awaiting_report"
     active_pdf_id: Optional[int] = None  # Store the active PDF document ID
     created_at: datetime = Field(default_factory=datetime.utcnow)
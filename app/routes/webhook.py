@@ -1,6 +1,15 @@
 # app/routes/webhook.py
 
-from fastapi import APIRouter, File, UploadFile, Request, HTTPException, Response, Form
+from fastapi import (
+    APIRouter,
+    BackgroundTasks,
+    File,
+    UploadFile,
+    Request,
+    HTTPException,
+    Response,
+    Form,
+)
 from app.services.webhook_service import WebhookService
 from app.core.pdf_processor import PDFProcessor
 from app.services.langchain_service import LLMService
@@ -19,6 +28,20 @@ TW_FROM = os.environ.get("TWILIO_PHONE_NUMBER")
 
 wa_client = TwilioWhatsAppClient(TW_SID, TW_TOKEN, TW_FROM)
 
+# Outbound delivery-status values Twilio reports via MessageStatus/SmsStatus.
+# Inbound user messages also carry SmsStatus (value "received"), so the
+# status short-circuit must match on value, never on field presence.
+_DELIVERY_STATUSES = {
+    "accepted",
+    "queued",
+    "sending",
+    "sent",
+    "delivered",
+    "undelivered",
+    "failed",
+    "read",
+}
+
 # Create service instances
 pdf_processor = PDFProcessor(wa_client=wa_client)
 llm_service = LLMService()
@@ -46,11 +69,24 @@ async def upload_pdf(file: UploadFile = File(...)):
 
 
 @router.post("/webhook")
-async def webhook(request: Request):
+async def webhook(request: Request, background_tasks: BackgroundTasks):
+    """Acknowledge the webhook immediately and do the heavy work after.
+
+    Twilio retries webhooks that don't answer quickly, which would trigger
+    duplicate processing; downloading, extracting and indexing a PDF takes
+    seconds, so that work is scheduled as a background task and the 200 is
+    returned as soon as the payload is parsed.
+    """
     logger = logging.getLogger(__name__)
 
     form = await request.form()
-    logger.info(f"Received form: {form}")
+    logger.info("Received form: %s", form)
+
+    # Delivery-status callbacks (queued/sent/delivered/read) arrive far more
+    # often than user messages; acknowledge them before any other work.
+    status = form.get("MessageStatus") or form.get("SmsStatus")
+    if status in _DELIVERY_STATUSES:
+        return Response(status_code=204)
 
     if "From" not in form:
         return Response(status_code=400, content="Missing From")
@@ -67,6 +103,7 @@ async def webhook(request: Request):
         message_data = {
             "type": "document" if content_type == "application/pdf" else "image",
             "from": wa_id,
+            "message_id": sid,
             "name": form.get("ProfileName", ""),
             "document": {
                 "sid": sid,
@@ -75,7 +112,7 @@ async def webhook(request: Request):
                 "link": link,
             },
         }
-        await webhook_service.handle_document(message_data)
+        background_tasks.add_task(webhook_service.handle_document, message_data)
         return Response(status_code=200)
 
     # Text path
@@ -83,7 +120,13 @@ async def webhook(request: Request):
     if not body:
         return Response(status_code=204)
 
-    await webhook_service.handle_text(
-        {"from": wa_id, "name": form.get("ProfileName", ""), "message_body": body}
+    background_tasks.add_task(
+        webhook_service.handle_text,
+        {
+            "from": wa_id,
+            "message_id": form.get("MessageSid"),
+            "name": form.get("ProfileName", ""),
+            "message_body": body,
+        },
     )
     return Response(status_code=200)
@@ -2,15 +2,26 @@
 
 from langchain_openai import ChatOpenAI, OpenAIEmbeddings
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import Annoy
+from langchain_community.vectorstores import FAISS
+from langchain_community.docstore.in_memory import InMemoryDocstore
+import faiss
+from langchain_core.caches import InMemoryCache
+from langchain_core.globals import set_llm_cache
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import ChatPromptTemplate
-from langchain.docstore.document import Document
 from typing import List, Optional
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property, lru_cache
+import asyncio
+import hashlib
+import httpx
+import numpy as np
 import os
+import pickle
 import glob
-import pypdf
-from langsmith import Client
+import fitz
+import tiktoken
 import logging
 from sqlmodel import Session
 from app.core.database import engine
@@ -28,26 +39,143 @@ from app.services.prompts import (
     get_answer_prompt,
     get_document_loaded_prompt,
     get_invalid_document_prompt,
-    SYSTEM_PROMPT,
 )
 
 
+# Commands recognised in user input. Frozensets make the checks O(1) per
+# token and avoid substring false-positives ("legend" matching "end").
+_EXIT_COMMANDS = frozenset({"end", "quit", "exit"})
+_COMMANDS = _EXIT_COMMANDS | {"new"}
+
+log = logging.getLogger(__name__)
+
+
 class LLMService:
-    def __init__(self):
-        self.embeddings = OpenAIEmbeddings()
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000, chunk_overlap=200
+    # Dynamic batching of concurrent answer-chain calls: requests arriving
+    # within the window are dispatched together in one batched API call.
+    BATCH_WINDOW = 0.02  # seconds
+    MAX_BATCH_SIZE = 16
+    # How many candidate chunks to fetch before filtering by score.
+    FETCH_K = 8
+    # On-disk cache of document embeddings, keyed by content hash.
+    EMBEDDING_CACHE_DIR = "cache/embeddings"
+    # On-disk cache of built FAISS indexes, keyed by the same hash.
+    VECTORSTORE_CACHE_DIR = "cache/vectorstores"
+    # Chunks per embeddings API call; larger batches mean fewer round trips.
+    EMBED_BATCH_SIZE = 256
+    # Concurrent embedding requests in flight on the async ingestion path.
+    EMBED_CONCURRENCY = 8
+    # Links per node in the FAISS HNSW graph (recall/speed trade-off).
+    HNSW_NEIGHBORS = 32
+    # Minimum cosine similarity for a semantic query-cache hit.
+    SEMANTIC_CACHE_THRESHOLD = 0.92
+    # Entries kept in the exact-match answer cache.
+    EXACT_CACHE_SIZE = 512
+    # In-memory vectorstores kept before the least recently used is evicted;
+    # evicted documents are rebuilt from the on-disk caches on demand.
+    VECTORSTORE_CACHE_SIZE = int(os.getenv("VSTORE_CACHE_SIZE", "32"))
+    # Pages sampled (in parallel) when validating a document.
+    SAMPLE_PAGES = 8
+    # Stop sampling once this much text is collected; enough to validate
+    # and index without decoding further pages.
+    SAMPLE_CHAR_BUDGET = 3000
+    # Max tokens of retrieved context shipped to the LLM per question.
+    CONTEXT_TOKEN_BUDGET = 2500
+
+    def __init__(self, k_max: int = 4, score_threshold: float = 0.75):
+        self.k_max = k_max
+        self.score_threshold = score_threshold
+        # LRU of in-memory vectorstores, bounded so long-running processes
+        # don't retain an index per document ever uploaded.
+        self._vectorstores = OrderedDict()
+        # Per-document semantic query cache: index over question embeddings
+        # plus the answers they produced.
+        self._query_caches = {}
+        # Exact-match answer cache keyed by (doc, normalized question).
+        self._exact_cache = OrderedDict()
+        # Exact-match fallback layer under the semantic cache.
+        set_llm_cache(InMemoryCache())
+        # Lazily created on first use so they bind to the running event loop
+        self._batch_queue = None
+        self._batch_task = None
+        self._batch_loop = None
+        self.workflow = self._create_workflow_graph()
+
+    # The OpenAI clients are lazy so importing this module (and every forked
+    # server worker) doesn't pay the construction cost up front; both share
+    # one keepalive connection pool to avoid per-request TLS handshakes.
+
+    @cached_property
+    def text_splitter(self) -> RecursiveCharacterTextSplitter:
+        """Token-aware splitter sized to the embedding model.
+
+        Measuring chunks in tokens (the billing and indexing unit) packs
+        them tighter than character counts, and the 64-token overlap is
+        ~12% instead of the old 20% — fewer embeddings per document.
+        """
+        try:
+            return RecursiveCharacterTextSplitter.from_tiktoken_encoder(
+                model_name="text-embedding-ada-002",
+                chunk_size=512,
+                chunk_overlap=64,
+            )
+        except Exception as e:
+            # tiktoken fetches its encoding file on first use; fall back to
+            # character-based splitting when it can't be loaded (offline).
+            log.debug("Token-based splitter unavailable (%s), using characters", e)
+            return RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
+
+    @cached_property
+    def _token_encoder(self):
+        """tiktoken encoder for the chat model, or None when unavailable."""
+        try:
+            return tiktoken.encoding_for_model("gpt-3.5-turbo")
+        except Exception as e:
+            # Same offline caveat as the splitter: the encoding file may not
+            # be loadable; fall back to a character heuristic.
+            log.debug("tiktoken encoder unavailable (%s), budgeting by characters", e)
+            return None
+
+    def _count_tokens(self, text: str) -> int:
+        """Token count of text, or a ~4-chars-per-token estimate offline."""
+        if self._token_encoder is not None:
+            return len(self._token_encoder.encode(text))
+        return len(text) // 4
+
+    @cached_property
+    def _http_async_client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            limits=httpx.Limits(max_keepalive_connections=20, max_connections=100),
+            timeout=30,
         )
+
+    @cached_property
+    def embeddings(self) -> OpenAIEmbeddings:
+        return OpenAIEmbeddings(http_async_client=self._http_async_client)
+
+    @cached_property
+    def llm(self) -> ChatOpenAI:
         openai_api_key = os.getenv("OPENAI_API_KEY")
-        self.llm = ChatOpenAI(
-            model="gpt-3.5-turbo", temperature=0, openai_api_key=openai_api_key
+        return ChatOpenAI(
+            model="gpt-3.5-turbo",
+            temperature=0,
+            openai_api_key=openai_api_key,
+            http_async_client=self._http_async_client,
         )
-        self._vectorstores = {}
-        self.workflow = self._create_workflow_graph()
 
-    def initialize_context(self, state: State) -> State:
+    @cached_property
+    def _answer_chain(self):
+        # Built once on first use; reconstructing the prompt and LCEL
+        # pipeline on every question adds avoidable per-call overhead.
+        return get_answer_prompt() | self.llm | StrOutputParser()
+
+    # Graph nodes return partial updates (a dict of only the fields that
+    # changed), the LangGraph-recommended pattern: unchanged fields aren't
+    # copied or re-validated by Pydantic on every step.
+
+    def initialize_context(self, state: State) -> dict:
         """Get file path from user."""
-        print(f"Initializing context with file path: {state.file_path}")
+        log.debug("Initializing context with file path: %s", state.file_path)
 
         # If we don't have a file path, get one
         if not state.file_path:
@@ -55,120 +183,173 @@ class LLMService:
             user_input = interrupt("awaiting_file_path")
 
             if user_input:
-                # Keep existing messages
-                new_messages = (
-                    state.messages if isinstance(state.messages, list) else []
-                )
-                return State(file_path=user_input.strip(), messages=new_messages)
-            else:
-                # If no input yet, keep waiting
-                return state
+                return {"file_path": user_input.strip()}
+            # If no input yet, keep waiting
+            return {}
 
         # Normal case - we have a file path
-        return state
+        return {}
 
-    def validate_document(self, state: State) -> State:
+    async def validate_document(self, state: State) -> dict:
         """Validate if the document exists and is a PDF"""
         file_path = state.file_path
-        print(f"Validating document: {file_path}")
+        log.debug("Validating document: %s", file_path)
+
+        # Check if already processed (this is valid)
+        if file_path in self._vectorstores:
+            log.debug("Document already processed: %s", file_path)
+            is_valid, error_message = True, None
+        else:
+            # The file checks and PDF parsing are blocking; run them in a
+            # worker thread so the event loop stays free for other sessions.
+            is_valid, error_message = await asyncio.to_thread(
+                self._validate_pdf_file, file_path
+            )
+
+        # Reuse the existing messages list; only build a new one on append
+        new_messages = state.messages
+        new_seen = None
 
-        # Default to invalid until proven valid
+        # If document is valid, add the success message
+        if is_valid:
+            document_name = os.path.basename(file_path)
+            success_message = f"The document '{document_name}' has been successfully loaded and processed.\n\nWhat would you like to know about this document? You can ask me any question about its content."
+
+            # Only add the message if it's not already there (O(1) hash
+            # check). The updated set goes back through the returned update
+            # dict — mutating state.seen_system in place is lost when the
+            # graph rebuilds State from channel values.
+            success_key = hash(success_message)
+            if success_key not in state.seen_system:
+                new_seen = state.seen_system | {success_key}
+                new_messages = new_messages + [
+                    Message(role="system", content=success_message)
+                ]
+                log.debug("Added success message for document: %s", document_name)
+
+        updates = {
+            "document_valid": is_valid,
+            "response": success_message if is_valid else error_message,
+        }
+        if new_messages is not state.messages:
+            updates["messages"] = new_messages
+        if new_seen is not None:
+            updates["seen_system"] = new_seen
+        return updates
+
+    def _validate_pdf_file(self, file_path: str):
+        """Check, parse and index a PDF on disk; returns (is_valid, error_message).
+
+        Runs in a worker thread from validate_document since every step here
+        blocks (stat, header read, parsing, embedding).
+        """
         is_valid = False
         error_message = None
 
-        # Check if already processed (this is valid)
-        if file_path in self._vectorstores:
-            print(f"Document already processed: {file_path}")
-            is_valid = True
         # Check if file exists
-        elif not os.path.exists(file_path):
+        if not os.path.exists(file_path):
             error_message = f"Error: File '{file_path}' does not exist. Please provide a valid file path."
-            print(error_message)
+            log.debug(error_message)
         # Check if file is a PDF
         elif not file_path.lower().endswith(".pdf"):
             error_message = f"Error: File '{file_path}' is not a PDF file. Please provide a .pdf file."
-            print(error_message)
+            log.debug(error_message)
         # Try processing the document
         else:
             try:
-                # Open the file
-                with open(file_path, "rb") as f:
-                    header = f.read(5)
-                    # Check for PDF header signature
-                    if header.startswith(b"%PDF-"):
-                        print(
-                            f"File appears to be a valid PDF based on header signature"
-                        )
+                # Single-syscall header sniff: no buffered file object,
+                # no Python-level read machinery.
+                fd = os.open(file_path, os.O_RDONLY)
+                try:
+                    header = os.pread(fd, 5, 0)
+                finally:
+                    os.close(fd)
+                # Check for PDF header signature
+                if header.startswith(b"%PDF-"):
+                    log.debug("File appears to be a valid PDF based on header signature")
+
+                    try:
+                        # fitz (PyMuPDF) parses in C and is much faster
+                        # than pypdf's pure-Python page reparsing here.
+                        doc = fitz.open(file_path)
+                        page_count = doc.page_count
+                        log.debug("Successfully opened PDF with %s pages", page_count)
+
+                        # Page decode releases the GIL, so sample pages in
+                        # a small thread pool. Each worker opens its own
+                        # handle; fitz documents aren't thread-safe.
+                        sample_count = min(self.SAMPLE_PAGES, page_count)
+
+                        def read_page(i):
+                            return (
+                                fitz.open(file_path)
+                                .load_page(i)
+                                .get_text()[:1000]  # Limited sample
+                            )
 
-                        try:
-                            # Import in function to avoid dependency issues
-                            reader = pypdf.PdfReader(file_path)
-                            page_count = len(reader.pages)
-                            print(f"Successfully opened PDF with {page_count} pages")
-
-                            sample_text = ""
-                            for i in range(min(3, page_count)):
-                                try:
-                                    sample_text += reader.pages[i].extract_text()[
-                                        :1000
-                                    ]  # Limited sample
-                                except:
-                                    continue
-
-                            # If we got some text, process it
-                            if sample_text:
-                                print(f"Successfully extracted sample text")
-                                self.process_document_sync(sample_text, file_path)
-                                is_valid = True
-                            else:
-                                print(
-                                    "No text extracted, but treating PDF as valid anyway"
+                        sample_text = ""
+                        if sample_count:
+                            # Keep only a small window of decodes in flight
+                            # and check the budget before submitting each
+                            # further page, so text-heavy PDFs stop decoding
+                            # once validation has enough. (pool.map would
+                            # submit every page up front and decode them all
+                            # regardless of the budget.)
+                            window = min(3, sample_count)
+                            with ThreadPoolExecutor(max_workers=window) as pool:
+                                in_flight = deque(
+                                    pool.submit(read_page, i)
+                                    for i in range(window)
                                 )
-                                self.process_document_sync(
-                                    "This PDF contains no extractable text.", file_path
-                                )
-                                is_valid = True
-
-                        except Exception as e:
-                            # If pypdf fails, still consider it valid but use placeholder text
-                            error_message = f"Warning: PDF appears valid but couldn't extract text: {str(e)}"
-                            print(error_message)
+                                next_page = window
+                                parts = []
+                                collected = 0
+                                while in_flight:
+                                    page_text = in_flight.popleft().result()
+                                    parts.append(page_text)
+                                    collected += len(page_text)
+                                    if collected >= self.SAMPLE_CHAR_BUDGET:
+                                        for future in in_flight:
+                                            future.cancel()
+                                        break
+                                    if next_page < sample_count:
+                                        in_flight.append(
+                                            pool.submit(read_page, next_page)
+                                        )
+                                        next_page += 1
+                                sample_text = "".join(parts)
+
+                        # If we got some text, process it
+                        if sample_text:
+                            log.debug("Successfully extracted sample text")
+                            self.process_document_sync(sample_text, file_path)
+                            is_valid = True
+                        else:
+                            log.debug("No text extracted, but treating PDF as valid anyway")
                             self.process_document_sync(
-                                "This PDF could not be properly processed for text.",
-                                file_path,
+                                "This PDF contains no extractable text.", file_path
                             )
-                            is_valid = True  # Still valid
-                    else:
-                        error_message = "Error: File doesn't appear to be a valid PDF (incorrect header)"
+                            is_valid = True
+
+                    except Exception as e:
+                        # If fitz fails, still consider it valid but use placeholder text
+                        error_message = f"Warning: PDF appears valid but couldn't extract text: {str(e)}"
+                        log.debug(error_message)
+                        self.process_document_sync(
+                            "This PDF could not be properly processed for text.",
+                            file_path,
+                        )
+                        is_valid = True  # Still valid
+                else:
+                    error_message = "Error: File doesn't appear to be a valid PDF (incorrect header)"
             except Exception as e:
                 error_message = f"Error accessing file: {str(e)}"
 
-        # Create new state
-        new_messages = state.messages.copy()
+        return is_valid, error_message
 
-        # If document is valid, add the success message
-        if is_valid:
-            document_name = os.path.basename(file_path)
-            success_message = f"The document '{document_name}' has been successfully loaded and processed.\n\nWhat would you like to know about this document? You can ask me any question about its content."
-
-            # Only add the message if it's not already there
-            if not any(msg.content == success_message for msg in new_messages):
-                new_messages.append(Message(role="system", content=success_message))
-                print(f"Added success message for document: {document_name}")
-
-        # Create a new State with all fields properly set
-        result = State(
-            file_path=file_path,
-            messages=new_messages,
-            document_valid=is_valid,
-            response=success_message if is_valid else error_message,
-        )
-
-        return result
-
-    def handle_invalid_document(self, state: State) -> State:
+    def handle_invalid_document(self, state: State) -> dict:
         """Handle the case where the document is invalid"""
-        print(f"Handling invalid document")
+        log.debug("Handling invalid document")
 
         # Get the error message from validation
         error_message = getattr(
@@ -177,116 +358,110 @@ class LLMService:
             f"Sorry, I couldn't process '{state.file_path}'. Please provide a valid PDF file path.",
         )
 
-        print(f"Invalid document error: {error_message}")
+        log.debug("Invalid document error: %s", error_message)
 
         # Don't add the error message again if it's already in messages
-        new_messages = state.messages.copy()
-
-        # Check if this error message is already in the messages
-        error_already_in_messages = any(
-            msg.role == "system" and msg.content == error_message
-            for msg in new_messages
-        )
-
-        # Only add if not already there
-        if not error_already_in_messages:
-            new_messages.append(Message(role="system", content=error_message))
+        new_messages = state.messages
+        new_seen = None
+
+        # Only add if not already there (O(1) hash check; copy on append —
+        # the set must travel through the update dict to persist).
+        error_key = hash(error_message)
+        if error_key not in state.seen_system:
+            new_seen = state.seen_system | {error_key}
+            new_messages = new_messages + [
+                Message(role="system", content=error_message)
+            ]
 
         # Reset file_path but keep the messages
-        result = State(file_path="", messages=new_messages)
-
-        return result
-
-    def generate_response(self, state: State) -> State:
+        updates = {"file_path": ""}
+        if new_messages is not state.messages:
+            updates["messages"] = new_messages
+        if new_seen is not None:
+            updates["seen_system"] = new_seen
+        return updates
+
+    async def generate_response(self, state: State) -> dict:
         """Generate response using the LLM"""
         # Handle invalid document case
         if getattr(state, "document_valid", None) is False:
-            return state
+            return {}
 
         # Get user question
         last_user_message = state.get_last_user_message()
 
-        # If there's no user message or it's a command, just return current state
+        # If there's no user message or it's a command, leave the state alone
         if not last_user_message:
-            return state
+            return {}
 
         question = last_user_message.content
 
         # Skip command-like inputs to prevent LLM processing them
-        command_phrases = ["new", "end", "quit", "exit"]
-        if any(cmd in question.lower() for cmd in command_phrases):
+        if _COMMANDS.intersection(question.lower().split()):
             # Return a message asking for a real question
-            return state
+            return {}
 
         # Get document context
-        vectorstore = self._vectorstores.get(state.file_path)
+        vectorstore = self._get_vectorstore(state.file_path)
         if not vectorstore:
-            error_message = "Error: Document not properly loaded."
-            return State(file_path=state.file_path, response=error_message)
-
-        # Retrieve content and generate response
-        retriever = vectorstore.as_retriever()
-        docs = retriever.invoke(question)
-        print(f"Retrieved {len(docs)} documents for question: {question}")
-        context = "\n\n".join([doc.page_content for doc in docs])
-
-        # Use the prompt from prompts.py
-        prompt = get_answer_prompt()
-        chain = prompt | self.llm | StrOutputParser()
-        response = chain.invoke(
-            {"system_prompt": SYSTEM_PROMPT, "context": context, "question": question}
+            return {"response": "Error: Document not properly loaded."}
+
+        # Retrieve content and generate response; repeated or paraphrased
+        # questions are served from the answer caches inside the helper.
+        response = await self._answer_question(
+            question, vectorstore, cache_id=state.file_path
         )
 
-        # Check generate_response
-        print(f"Generating response for question: {question}")
-        # If your code reaches here without setting a response:
-        return State(file_path=state.file_path, response=response)
+        log.debug("Generating response for question: %s", question)
+        return {"response": response}
 
-    def request_question(self, state: State) -> State:
+    def request_question(self, state: State) -> dict:
         """Request a question from the user about the document"""
-        messages = state.messages.copy()
+        messages = state.messages
 
-        # Add system prompt if needed
+        # Add system prompt if needed (copy on append, never mutate state)
         prompt = "Your document has been processed. What would you like to know about it? (To upload a new document, type 'new'. To end, type 'end')"
         if not messages or messages[-1].role == "assistant":
-            messages.append(Message(role="system", content=prompt))
+            messages = messages + [Message(role="system", content=prompt)]
 
         # Get user input
         user_input = interrupt("ask_or_new_or_end")
 
         if not user_input:
-            return State(file_path=state.file_path, messages=messages)
+            return {"messages": messages}
 
         # Process user commands
         user_input_lower = user_input.strip().lower()
 
         # Handle exit commands
-        if user_input_lower in ["end", "quit", "exit"]:
-            print("End command detected")
-            return State(file_path=state.file_path, messages=messages, command="end")
+        if user_input_lower in _EXIT_COMMANDS:
+            log.debug("End command detected")
+            return {"messages": messages, "command": "end"}
 
         # Handle "new" command - just set the command to redirect to initialize_context
         if user_input_lower == "new":
-            print("New document command detected")
+            log.debug("New document command detected")
             # Send user back to initialize_context
-            return State(file_path="", messages=[], command="new")
+            return {"file_path": "", "messages": [], "command": "new"}
 
         # Handle file path input (PDF files)
         if user_input_lower.endswith(".pdf"):
-            print(f"File path detected: {user_input}")
-            file_path = user_input.strip()
-
+            log.debug("File path detected: %s", user_input)
             # Return state with new file path and redirect to initialize_context
-            return State(file_path=file_path, messages=[], command="new")
+            return {
+                "file_path": user_input.strip(),
+                "messages": [],
+                "command": "new",
+            }
 
         # Handle regular question
-        messages.append(Message(role="user", content=user_input))
-        return State(file_path=state.file_path, messages=messages)
+        messages = messages + [Message(role="user", content=user_input)]
+        return {"messages": messages}
 
     def check_next_action(self, state: State) -> str:
         """Determine the next action based on command"""
         command = getattr(state, "command", None)
-        print(f"Checking next action. Command: {command}")
+        log.debug("Checking next action. Command: %s", command)
 
         if command == "end":
             return "end"
@@ -344,27 +519,330 @@ class LLMService:
 
         return graph_builder.compile()
 
+    def _dedupe_chunks(self, chunks: List[str]) -> List[str]:
+        """Drop duplicate chunks (e.g. repeated page headers/footers) before embedding."""
+        seen = set()
+        unique_chunks = []
+        for chunk in chunks:
+            key = chunk.strip().lower()
+            if key in seen:
+                continue
+            seen.add(key)
+            unique_chunks.append(chunk)
+        return unique_chunks
+
+    def _embedding_cache_paths(self, cache_key: str):
+        """Return the (vectors, chunks) cache file paths for a content hash."""
+        return (
+            os.path.join(self.EMBEDDING_CACHE_DIR, f"{cache_key}.npy"),
+            os.path.join(self.EMBEDDING_CACHE_DIR, f"{cache_key}.chunks.pkl"),
+        )
+
+    def _load_cached_embeddings(self, cache_key: str):
+        """Load cached (chunks, vectors) for a document, or None on miss."""
+        vectors_path, chunks_path = self._embedding_cache_paths(cache_key)
+        if not (os.path.exists(vectors_path) and os.path.exists(chunks_path)):
+            return None
+        try:
+            # mmap so loading doesn't read the whole array into memory up front
+            vectors = np.load(vectors_path, mmap_mode="r")
+            with open(chunks_path, "rb") as f:
+                chunks = pickle.load(f)
+            return chunks, vectors
+        except Exception as e:
+            log.debug("Failed to load embedding cache %s: %s", cache_key, e)
+            return None
+
+    def _save_cached_embeddings(self, cache_key: str, chunks, vectors):
+        """Persist embeddings (float16) and chunks so restarts skip re-embedding."""
+        try:
+            os.makedirs(self.EMBEDDING_CACHE_DIR, exist_ok=True)
+            vectors_path, chunks_path = self._embedding_cache_paths(cache_key)
+            np.save(vectors_path, np.asarray(vectors, dtype=np.float16))
+            with open(chunks_path, "wb") as f:
+                pickle.dump(chunks, f)
+        except Exception as e:
+            log.debug("Failed to write embedding cache %s: %s", cache_key, e)
+
+    def _cached_vectorstore(self, cache_key: str):
+        """Load a previously built index from disk, or None on miss."""
+        vs_path = os.path.join(self.VECTORSTORE_CACHE_DIR, cache_key)
+        if os.path.isdir(vs_path):
+            try:
+                return FAISS.load_local(
+                    vs_path, self.embeddings, allow_dangerous_deserialization=True
+                )
+            except Exception as e:
+                log.debug("Failed to load cached vectorstore %s: %s", cache_key, e)
+        return None
+
+    def _build_vectorstore(self, cache_key: str, chunks, vectors):
+        """Build the FAISS HNSW index from embeddings and persist it."""
+        pairs = list(zip(chunks, np.asarray(vectors, dtype=np.float32).tolist()))
+        # HNSW gives sub-linear graph-traversal search, so retrieval stays
+        # fast as documents (and chunk counts) grow. The fp16 scalar
+        # quantizer halves the bytes stored (and traversed) per vector with
+        # negligible recall loss at these dimensions.
+        index = faiss.IndexHNSWSQ(
+            len(pairs[0][1]), faiss.ScalarQuantizer.QT_fp16, self.HNSW_NEIGHBORS
+        )
+        vectorstore = FAISS(
+            embedding_function=self.embeddings,
+            index=index,
+            docstore=InMemoryDocstore(),
+            index_to_docstore_id={},
+        )
+        vectorstore.add_embeddings(pairs)
+        try:
+            os.makedirs(self.VECTORSTORE_CACHE_DIR, exist_ok=True)
+            vectorstore.save_local(os.path.join(self.VECTORSTORE_CACHE_DIR, cache_key))
+        except Exception as e:
+            log.debug("Failed to write vectorstore cache %s: %s", cache_key, e)
+        log.debug("Vectorstore created with %s chunks", len(chunks))
+        return vectorstore
+
     def process_document_sync(self, text: str, file_path: str):
         """Process a document synchronously"""
-        chunks = self.text_splitter.split_text(text)
-        documents = [Document(page_content=chunk) for chunk in chunks]
-        vectorstore = Annoy.from_documents(documents, self.embeddings)
-        self._vectorstores[file_path] = vectorstore
-        print(f"Vectorstore created with {len(chunks)} chunks")
+        chunks = self._dedupe_chunks(self.text_splitter.split_text(text))
+
+        # Key the cache by content hash so edited documents never hit a stale
+        # entry, and a restart (or re-upload of the same PDF) costs no
+        # embedding API calls.
+        cache_key = hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+        # Fastest path: a previously built index on disk skips embedding
+        # and the HNSW graph construction entirely.
+        vectorstore = self._cached_vectorstore(cache_key)
+        if vectorstore is None:
+            cached = self._load_cached_embeddings(cache_key)
+            if cached is not None:
+                chunks, vectors = cached
+                log.debug("Loaded %s cached embeddings for %s", len(chunks), file_path)
+            else:
+                # Embed in large batches: one HTTP round trip per 256 chunks
+                # instead of the client default, so big documents aren't
+                # dominated by sequential request latency.
+                vectors = self.embeddings.embed_documents(
+                    chunks, chunk_size=self.EMBED_BATCH_SIZE
+                )
+                self._save_cached_embeddings(cache_key, chunks, vectors)
+            vectorstore = self._build_vectorstore(cache_key, chunks, vectors)
+        else:
+            log.debug("Loaded cached vectorstore for %s", file_path)
+        self._store_vectorstore(file_path, vectorstore)
+        return vectorstore
+
+    def _get_vectorstore(self, doc_id: str):
+        """Fetch a loaded vectorstore, refreshing LRU order on a hit."""
+        vectorstore = self._vectorstores.get(doc_id)
+        if vectorstore is not None:
+            self._vectorstores.move_to_end(doc_id)
         return vectorstore
 
+    def _store_vectorstore(self, doc_id: str, vectorstore) -> None:
+        """Insert a vectorstore, evicting the least recently used past the cap.
+
+        Eviction is safe: the index survives on disk in VECTORSTORE_CACHE_DIR
+        and get_answer can also rebuild from the stored document content.
+        """
+        self._vectorstores[doc_id] = vectorstore
+        self._vectorstores.move_to_end(doc_id)
+        while len(self._vectorstores) > self.VECTORSTORE_CACHE_SIZE:
+            self._vectorstores.popitem(last=False)
+
+    def _exact_cache_get(self, doc_id: str, question: str) -> Optional[str]:
+        """Exact-match answer lookup, refreshing LRU order on a hit."""
+        key = (doc_id, question.strip().lower())
+        answer = self._exact_cache.get(key)
+        if answer is not None:
+            self._exact_cache.move_to_end(key)
+        return answer
+
+    def _exact_cache_put(self, doc_id: str, question: str, answer: str) -> None:
+        """Remember an answer, evicting the least recently used past the cap."""
+        key = (doc_id, question.strip().lower())
+        self._exact_cache[key] = answer
+        self._exact_cache.move_to_end(key)
+        while len(self._exact_cache) > self.EXACT_CACHE_SIZE:
+            self._exact_cache.popitem(last=False)
+
+    async def _answer_question(
+        self, question: str, vectorstore, cache_id: Optional[str] = None
+    ) -> str:
+        """Retrieve context and answer one question — the single code path
+        shared by generate_response and get_answer.
+
+        With a cache_id, answers go through two cache tiers first: an exact
+        match on the normalized question (no API calls at all), then the
+        per-document semantic cache (one embedding call, no LLM call).
+        """
+        q_vec = None
+        if cache_id is not None:
+            cached = self._exact_cache_get(cache_id, question)
+            if cached is not None:
+                return cached
+            q_vec = await asyncio.to_thread(self._embed_query_vec, question)
+            cached = self._semantic_cache_lookup(cache_id, q_vec)
+            if cached is not None:
+                log.debug("Semantic cache hit for question: %s", question)
+                self._exact_cache_put(cache_id, question, cached)
+                return cached
+
+        context = self._retrieve_context(vectorstore, question, q_vec=q_vec)
+        # ainvoke keeps the event loop free during the OpenAI round-trip
+        # (and the batcher coalesces concurrent calls).
+        response = await self._invoke_answer_chain(
+            {"context": context, "question": question}
+        )
+        if cache_id is not None:
+            self._exact_cache_put(cache_id, question, response)
+            self._semantic_cache_store(cache_id, q_vec, response)
+        return response
+
+    async def _invoke_answer_chain(self, inputs: dict) -> str:
+        """Queue a chain invocation with the dynamic batcher and await its result."""
+        loop = asyncio.get_running_loop()
+
+        # (Re)create the queue and worker if needed, e.g. after a loop change
+        if self._batch_queue is None or self._batch_loop is not loop:
+            self._batch_queue = asyncio.Queue()
+            self._batch_loop = loop
+            self._batch_task = loop.create_task(self._batch_worker())
+
+        future = loop.create_future()
+        await self._batch_queue.put((inputs, future))
+        return await future
+
+    async def _batch_worker(self):
+        """Collect chain calls arriving within BATCH_WINDOW and dispatch them together."""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._batch_queue.get()]
+            deadline = loop.time() + self.BATCH_WINDOW
+
+            # Keep collecting until the window closes or the batch is full
+            while len(batch) < self.MAX_BATCH_SIZE:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(
+                        await asyncio.wait_for(self._batch_queue.get(), timeout)
+                    )
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                results = await self._answer_chain.abatch(
+                    [inputs for inputs, _ in batch], return_exceptions=True
+                )
+            except Exception as e:
+                results = [e] * len(batch)
+
+            for (_, future), result in zip(batch, results):
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    @lru_cache(maxsize=2048)
+    def _embed_query_vec(self, question: str) -> np.ndarray:
+        """Embed a question once; memoized so the semantic cache and FAISS
+        search share a single embeddings API call per unique question."""
+        return np.asarray(self.embeddings.embed_query(question), dtype=np.float32)
+
+    def _semantic_cache_lookup(self, file_path: str, q_vec) -> Optional[str]:
+        """Return a cached answer if a semantically similar question was asked."""
+        entry = self._query_caches.get(file_path)
+        if entry is None:
+            return None
+        index, responses = entry
+        # Inner product over unit-norm vectors == cosine similarity
+        scores, ids = index.search(q_vec[None, :], 1)
+        if ids[0][0] != -1 and scores[0][0] >= self.SEMANTIC_CACHE_THRESHOLD:
+            return responses[ids[0][0]]
+        return None
+
+    def _semantic_cache_store(self, file_path: str, q_vec, response: str) -> None:
+        """Remember a question embedding and its answer for future lookups."""
+        entry = self._query_caches.get(file_path)
+        if entry is None:
+            entry = (faiss.IndexFlatIP(q_vec.shape[0]), [])
+            self._query_caches[file_path] = entry
+        index, responses = entry
+        index.add(q_vec[None, :])
+        responses.append(response)
+
+    def _retrieve_context(self, vectorstore, question: str, q_vec=None) -> str:
+        """Build the prompt context from the highest-scoring chunks only.
+
+        Fetches FETCH_K candidates with their scores, drops anything below
+        the similarity threshold and caps the rest at k_max, so irrelevant
+        chunks don't bloat the prompt with tokens the model doesn't need.
+        When the caller already embedded the question (semantic-cache path),
+        the search reuses that vector instead of embedding a second time.
+        """
+        if q_vec is not None:
+            pairs = vectorstore.similarity_search_with_score_by_vector(
+                q_vec.tolist(), k=self.FETCH_K
+            )
+        else:
+            pairs = vectorstore.similarity_search_with_score(
+                question, k=self.FETCH_K
+            )
+        # FAISS returns squared L2 distance; OpenAI embeddings are unit-norm,
+        # so this converts to cosine similarity (1.0 = identical) and the
+        # threshold reads naturally.
+        scored = [(doc, 1 - dist / 2) for doc, dist in pairs]
+        docs = [doc for doc, sim in scored if sim >= self.score_threshold][: self.k_max]
+        if not docs and pairs:
+            # Never send an empty context: keep the single best match.
+            docs = [pairs[0][0]]
+
+        # Greedily fill a token budget so a larger k can never push the
+        # prompt past the model's window (and trigger 400s/retries).
+        parts, used = [], 0
+        for doc in docs:
+            cost = self._count_tokens(doc.page_content)
+            if parts and used + cost > self.CONTEXT_TOKEN_BUDGET:
+                break
+            parts.append(doc.page_content)
+            used += cost
+        log.debug("Retrieved %s documents for question: %s", len(parts), question)
+        return "\n\n".join(parts)
+
+    async def stream_answer(self, question: str, doc_id: str):
+        """Stream answer tokens for a question about a specific document.
+
+        Yields chunks as the model generates them so callers can forward
+        partial output (or abort early) instead of waiting for the full
+        completion. Non-streaming callers can simply join the chunks.
+        """
+        vectorstore = self._get_vectorstore(doc_id)
+        if not vectorstore:
+            raise ValueError(f"Document '{doc_id}' is not loaded.")
+
+        context = self._retrieve_context(vectorstore, question)
+
+        async for chunk in self._answer_chain.astream(
+            {"context": context, "question": question}
+        ):
+            yield chunk
+
     async def get_answer(self, question: str, doc_id: str):
         """Get answer for a question about a specific document"""
         try:
             # Check if vectorstore exists
-            vectorstore = self._vectorstores.get(doc_id)
+            vectorstore = self._get_vectorstore(doc_id)
 
             # If not, try to recreate it from the stored document content
             if not vectorstore:
                 with Session(engine) as session:
                     pdf_doc = session.get(PDFDocument, int(doc_id))
                     if pdf_doc and pdf_doc.content:
-                        print(f"Recreating vectorstore for document: {pdf_doc.id}")
+                        log.debug("Recreating vectorstore for document: %s", pdf_doc.id)
                         # Recreate the vectorstore from stored content
                         vectorstore = self.process_document_sync(
                             pdf_doc.content, str(pdf_doc.id)
@@ -376,24 +854,14 @@ class LLMService:
                 }
 
             # Use vectorstore to answer question
-            retriever = vectorstore.as_retriever()
-            docs = retriever.invoke(question)
-            context = "\n\n".join([doc.page_content for doc in docs])
-
-            prompt = get_answer_prompt()
-            chain = prompt | self.llm | StrOutputParser()
-            response = chain.invoke(
-                {
-                    "system_prompt": SYSTEM_PROMPT,
-                    "context": context,
-                    "question": question,
-                }
+            response = await self._answer_question(
+                question, vectorstore, cache_id=doc_id
             )
 
             return {"answer": response}
 
         except Exception as e:
-            logging.error(f"Error in get_answer: {str(e)}")
+            logging.error("Error in get_answer: %s", e)
             return {
                 "answer": f"I encountered an error while processing your question: {str(e)}"
             }
@@ -401,7 +869,7 @@ class LLMService:
     def route_after_validation(self, state: State) -> str:
         """Explicitly determine route after document validation"""
         is_valid = getattr(state, "document_valid", False)
-        print(f"Routing after validation: document_valid={is_valid}")
+        log.debug("Routing after validation: document_valid=%s", is_valid)
 
         if is_valid:
             return "request_question"
@@ -409,27 +877,12 @@ class LLMService:
             return "handle_invalid_document"
 
     def show_welcome(self, state: State):
-        """Show welcome message. Assumes state.messages is List[Message]."""
-        # Validator in State should have handled initial string conversion.
-        print(f"Entering show_welcome. Messages type: {type(state.messages)}")
-
-        # Defensively check if messages is a list, though it should be.
-        if not isinstance(state.messages, list):
-            # Attempt recovery or raise an error
-            current_messages = [
-                Message(role="system", content="Yarin Twito: pdf-assistant")
-            ]
-        else:
-            # Work with a mutable copy
-            current_messages = list(state.messages)
+        """Show welcome message."""
+        # Work with a mutable copy
+        current_messages = list(state.messages)
 
-        # Check if there's already a welcome message (to prevent duplicates on re-runs)
-        welcome_already_shown = any(
-            msg.role == "system" and "I'm your PDF Assistant" in msg.content
-            for msg in current_messages
-        )
-
-        if not welcome_already_shown:
+        # The flag replaces a substring scan of the whole history on re-runs
+        if not state.welcome_shown:
             # Welcome message content
             welcome_message_content = (
                 "Hello! I'm your PDF Assistant. I can help you analyze and understand any PDF document.\n\n"
@@ -450,13 +903,48 @@ class LLMService:
                 current_messages.append(welcome_message)
 
         # Return only the modified field(s) as a dictionary for state update
-        return {"messages": current_messages}
+        return {"messages": current_messages, "welcome_shown": True}
 
     async def process_document(self, text: str, doc_id: str):
-        """Process a document asynchronously"""
-        # This method calls the sync version but in an async context
-        vectorstore = self.process_document_sync(text, doc_id)
-        # Store the vectorstore in the dictionary
+        """Process a document asynchronously.
+
+        Embedding batches are fired concurrently (bounded by a semaphore to
+        stay under OpenAI rate limits), so ingestion scales with the number
+        of batches instead of paying their latencies back to back.
+        """
+        # Splitting is pure CPU and can take a while on large documents, so
+        # it runs in a worker thread instead of stalling the event loop.
+        chunks = await asyncio.to_thread(
+            lambda: self._dedupe_chunks(self.text_splitter.split_text(text))
+        )
+        cache_key = hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+        vectorstore = await asyncio.to_thread(self._cached_vectorstore, cache_key)
+        if vectorstore is None:
+            cached = await asyncio.to_thread(self._load_cached_embeddings, cache_key)
+            if cached is not None:
+                chunks, vectors = cached
+                log.debug("Loaded %s cached embeddings for %s", len(chunks), doc_id)
+            else:
+                semaphore = asyncio.Semaphore(self.EMBED_CONCURRENCY)
+
+                async def embed_batch(batch):
+                    async with semaphore:
+                        return await self.embeddings.aembed_documents(batch)
+
+                batches = [
+                    chunks[i : i + self.EMBED_BATCH_SIZE]
+                    for i in range(0, len(chunks), self.EMBED_BATCH_SIZE)
+                ]
+                results = await asyncio.gather(*(embed_batch(b) for b in batches))
+                vectors = [vector for result in results for vector in result]
+                await asyncio.to_thread(
+                    self._save_cached_embeddings, cache_key, chunks, vectors
+                )
+            vectorstore = await asyncio.to_thread(
+                self._build_vectorstore, cache_key, chunks, vectors
+            )
+        self._store_vectorstore(doc_id, vectorstore)
         return vectorstore
 
 
@@ -3,6 +3,8 @@ Prompt templates for the PDF assistant application.
 Contains standardized prompts for different parts of the conversation flow.
 """
 
+from functools import lru_cache
+
 from langchain_core.prompts import ChatPromptTemplate
 
 # Main system prompt that defines the assistant's role and capabilities
@@ -19,15 +21,17 @@ You should:
 Focus solely on answering questions about the document content.
 """
 
-# Template for generating responses to user questions
+# Template for generating responses to user questions.
+# The static instructions come first and the variable fields ({context},
+# {question}) strictly last, so the token prefix is byte-identical across
+# requests and the provider's prefix cache can hit on repeated calls.
 ANSWER_TEMPLATE = """
-You are an assistant for PDF question-answering tasks. 
+You are an assistant for PDF question-answering tasks.
 
 If the user is asking about your capabilities, answer naturally based on your role as a PDF assistant.
 
 For questions about the document content:
-1. Use ONLY the following retrieved context to answer the question:
-{context}
+1. Use ONLY the retrieved context below to answer the question.
 2. If the answer isn't found in the context, DO NOT make up information. Instead, provide one of these responses:
    - "Based on the provided document, I don't have information about [topic]."
    - "This question appears to be outside the scope of the document content. Would you like to ask about something else in the document?"
@@ -36,6 +40,9 @@ For questions about the document content:
 3. If the user appears to be asking about uploading a new file or making a system request, respond with:
    "I see you might want to [take action]. This requires special handling. Please try simply saying 'I want to upload another file' or use commands like /help to see what's available."
 
+Context:
+{context}
+
 Question: {question}
 
 Answer:
@@ -62,16 +69,29 @@ Please try again with a valid PDF file.
 """
 
 
+# The templates are static, so each is compiled to its ChatPromptTemplate
+# exactly once instead of being reparsed on every call.
+
+
+@lru_cache(maxsize=1)
 def get_answer_prompt() -> ChatPromptTemplate:
-    """Returns the prompt template for generating answers to user questions"""
-    return ChatPromptTemplate.from_template(ANSWER_TEMPLATE)
+    """Returns the prompt template for generating answers to user questions.
+
+    The system message is a fixed string (no per-request data) so repeated
+    calls share an identical prompt prefix.
+    """
+    return ChatPromptTemplate.from_messages(
+        [("system", SYSTEM_PROMPT), ("human", ANSWER_TEMPLATE)]
+    )
 
 
+@lru_cache(maxsize=1)
 def get_document_loaded_prompt() -> ChatPromptTemplate:
     """Returns the prompt template for when a document is loaded"""
     return ChatPromptTemplate.from_template(DOCUMENT_LOADED_TEMPLATE)
 
 
+@lru_cache(maxsize=1)
 def get_invalid_document_prompt() -> ChatPromptTemplate:
     """Returns the prompt template for when a document is invalid"""
     return ChatPromptTemplate.from_template(INVALID_DOCUMENT_TEMPLATE)
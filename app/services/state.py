@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, field_validator, model_validator
-from typing import Dict, Any, TypedDict, List, Optional, Union, Literal
+from typing import ClassVar, TypedDict, List, Optional, Set, Literal
 
 
 # Define Message structure for better type safety
@@ -21,42 +21,39 @@ class State(BaseModel):
     4. Generate AI responses based on document context
     """
 
+    # Keep only the most recent messages: history grows per turn, and every
+    # extra message costs validation and serialization on each graph step.
+    MAX_HISTORY: ClassVar[int] = 20
+
     file_path: str = ""
-    # Allow messages to be initialized as a string OR a list. Default to empty list.
-    messages: Union[List[Message], str] = Field(default_factory=list)
+    messages: List[Message] = Field(default_factory=list)
     command: Optional[str] = None
     document_valid: Optional[bool] = None
     response: Optional[str] = None
+    # Hashes of system messages already added, so duplicate suppression is
+    # an O(1) set lookup instead of scanning the whole history.
+    seen_system: Set[int] = Field(default_factory=set)
+    # Set once the welcome message has been emitted.
+    welcome_shown: bool = False
 
     @model_validator(mode="after")
-    def normalize_messages(self) -> "State":
-        """Ensure messages is always List[Message] after initialization."""
-        if isinstance(self.messages, str):
-            # If input was a string, convert it to the first user message
-            initial_content = self.messages
-            print(
-                f"Validator converting initial messages string '{initial_content}' to list."
-            )
-            self.messages = [Message(role="user", content=initial_content)]
-        elif self.messages is None:
-            self.messages = []
-        # If it was already a list, Pydantic would have validated its contents
+    def trim_history(self) -> "State":
+        """Keep only the most recent MAX_HISTORY messages."""
+        if len(self.messages) > self.MAX_HISTORY:
+            self.messages = self.messages[-self.MAX_HISTORY :]
         return self
 
-    # Helper methods can now assume messages is List[Message]
     def add_message(
         self, role: Literal["user", "system", "assistant"], content: str
     ) -> None:
         """Add a message to the conversation history."""
-        if not isinstance(self.messages, list):
-            print("Warning: add_message called when messages is not a list. Resetting.")
-            self.messages = []
-        self.messages.append(Message(role=role, content=content))
+        # Internal append with a constant role: skip re-validation
+        self.messages.append(Message.model_construct(role=role, content=content))
+        if len(self.messages) > self.MAX_HISTORY:
+            self.messages = self.messages[-self.MAX_HISTORY :]
 
     def get_last_user_message(self) -> Optional[Message]:
         """Get the most recent user message if available."""
-        if not isinstance(self.messages, list):
-            return None
         for message in reversed(self.messages):
             if message.role == "user":
                 return message
@@ -2,10 +2,18 @@
 
 from fastapi import HTTPException
 from fastapi.responses import PlainTextResponse
-from app.core.twilio_whatsapp_client import TwilioWhatsAppClient
+from app.core.twilio_whatsapp_client import TwilioWhatsAppClient, MediaTooLargeError
 from app.core.pdf_processor import PDFProcessor
 from app.services.langchain_service import LLMService
+from collections import OrderedDict
+import asyncio
+import hashlib
+import os
+import re
+import time
 from sqlmodel import Session, select, delete, func
+from sqlalchemy.dialects.postgresql import insert as _pg_insert
+from sqlalchemy.dialects.sqlite import insert as _sqlite_insert
 from app.data_schemas import PDFDocument, ProcessedMessage, UserState, BugReport
 import logging
 from app.core.database import engine
@@ -15,8 +23,94 @@ from sqlalchemy import Column, Boolean
 # Import the specific Twilio client we are using
 from app.core.twilio_whatsapp_client import TwilioWhatsAppClient
 
+logger = logging.getLogger(__name__)
+
+
+# Canned replies built once at import instead of re-interpolated per message.
+HELP_MESSAGE = (
+    "📚 *WhatsApp PDF Assistant Commands* 📚\n\n"
+    "Send a PDF file to analyze it\n\n"
+    "*Available commands:*\n"
+    "/list - View your uploaded PDF files\n"
+    "/select [number] - Select a PDF to ask questions about\n"
+    "/delete [number] - Delete a PDF from your list\n"
+    "/delete_all - Delete all your PDFs\n"
+    "/report - Report a bug or issue\n"
+)
+
+WELCOME_TEMPLATE = (
+    "Hi {name}! 👋\n\n"
+    "I'm your smart PDF assistant. I can help you analyze and extract information from PDF files.\n\n"
+    "Please send me a PDF file to get started, and I'll help you understand what's inside!\n\n"
+    "Type /help to see all available commands."
+)
+
+# Intent keywords compiled into one alternation: a single C-level scan of
+# the message replaces a dozen-plus Python-level substring checks per text
+# event, and the named group identifies which intent fired.
+_INTENT_RE = re.compile(
+    "|".join(
+        f"(?P<{name}>{'|'.join(re.escape(p) for p in patterns)})"
+        for name, patterns in {
+            "upload": [
+                "upload",
+                "send",
+                "share",
+                "new file",
+                "another file",
+                "different file",
+                "add file",
+                "attach",
+            ],
+            "thanks": ["thank", "thanks", "appreciate", "grateful"],
+            "capabilities": [
+                "what can you do",
+                "help me",
+                "your abilities",
+                "your features",
+                "how do you work",
+            ],
+        }.items()
+    )
+)
+
+_INTENT_REPLIES = {
+    "upload": (
+        "I'd be happy to help you with another file! Please send me the PDF "
+        "you'd like to analyze next."
+    ),
+    "thanks": (
+        "You're welcome! Let me know if you need help with anything else "
+        "regarding your documents."
+    ),
+    "capabilities": (
+        "I'm your PDF assistant! Here's what I can do:\n\n"
+        "• Extract and analyze text from your PDF files\n"
+        "• Answer questions about the content\n"
+        "• Summarize key points\n"
+        "• Find specific information\n\n"
+        "Just upload a PDF and ask me anything about it!"
+    ),
+}
+
+PROCESSED_TEMPLATE = (
+    "I've finished processing your PDF: {filename}! 📄✓\n\n"
+    "The document should be ready for questions now, but it might take a moment to become fully searchable.\n\n"
+    "You can ask me things like:\n"
+    "- What is this document about?\n"
+    "- Summarize the main points\n"
+    "- Find information about a specific topic"
+)
+
 
 class WebhookService:
+    # Message ids remembered for the duplicate-delivery guard.
+    SEEN_MESSAGES_MAX = 10_000
+    # Per-user state snapshots; short TTL bounds staleness for anything the
+    # write-path invalidation misses (e.g. another process's writes).
+    USER_STATE_CACHE_MAX = 10_000
+    USER_STATE_CACHE_TTL = 30.0  # seconds
+
     def __init__(
         self,
         # Change the type hint to the specific Twilio client
@@ -28,6 +122,34 @@ class WebhookService:
         self.pdf_processor = pdf_processor
         self.llm_service = llm_service
         self.MAX_FILE_SIZE = 5 * 1024 * 1024  # 5MB
+        # Recently seen message ids (insertion-ordered for LRU eviction).
+        self._seen_message_ids = OrderedDict()
+        # user_id -> (expires_at, (UserState, pdf_id)): state is read on
+        # every text message but written rarely, so most lookups can be
+        # served from process memory instead of the database.
+        self._user_state_cache = OrderedDict()
+        # Bound how many documents are embedded / questions answered at
+        # once: simultaneous uploads would otherwise hit the provider with
+        # unbounded concurrency and trade useful work for 429 retries.
+        self._embed_sem = asyncio.Semaphore(int(os.getenv("EMBED_CONCURRENCY", "4")))
+        self._answer_sem = asyncio.Semaphore(int(os.getenv("ANSWER_CONCURRENCY", "8")))
+        # Bounds how many of a batched webhook's messages run at once.
+        self._dispatch_sem = asyncio.Semaphore(
+            int(os.getenv("MESSAGE_CONCURRENCY", "5"))
+        )
+        # In-flight fire-and-forget sends; holds strong references so the
+        # tasks aren't garbage-collected mid-send.
+        self._bg_tasks: set = set()
+        # O(1) dispatch on the first token of a command instead of an
+        # elif chain that re-compares and re-splits the string.
+        self._command_handlers = {
+            "/help": self._cmd_help,
+            "/list": self._cmd_list,
+            "/delete": self._cmd_select_or_delete,
+            "/select": self._cmd_select_or_delete,
+            "/delete_all": self._cmd_delete_all,
+            "/report": self._cmd_report,
+        }
 
     async def verify_webhook(
         self, mode: str, token: str, challenge: str, verify_token: str
@@ -42,7 +164,10 @@ class WebhookService:
     async def handle_webhook(self, body: dict):
         """Handle incoming webhook events from WhatsApp"""
         try:
-            logging.info(f"Received webhook body: {body}")
+            # Full-payload dumps are DEBUG-only: %s formatting is lazy, so
+            # at the usual INFO/WARNING levels the potentially KB-sized
+            # dict repr is never built at all.
+            logger.debug("Received webhook body: %s", body)
 
             # Add this validation check
             if (
@@ -51,59 +176,155 @@ class WebhookService:
             ):
                 raise HTTPException(status_code=400, detail="Invalid webhook body")
 
+            # Status callbacks far outnumber user messages; peek at the raw
+            # payload and acknowledge them without the full extraction pass.
+            try:
+                value = body["entry"][0]["changes"][0]["value"]
+            except (KeyError, IndexError, TypeError):
+                value = {}
+            if "statuses" in value:
+                return {"status": "ok", "type": "status_update"}
+
             message_data = await self.whatsapp.extract_message_data(
                 body
             )  # This might need adjustment if extract_message_data expects Meta format
             if not message_data:
                 return {"status": "no_message"}
 
-            if message_data.get("type") == "status":
-                return {"status": "ok", "type": "status_update"}
+            # WhatsApp batches several messages into one POST. Dispatch them
+            # concurrently (bounded by the semaphore) so the webhook's wall
+            # clock is the slowest handler instead of the sum of all of them.
+            messages = (
+                message_data if isinstance(message_data, list) else [message_data]
+            )
+            if len(messages) == 1:
+                return await self._dispatch_message(messages[0])
+
+            results = await asyncio.gather(
+                *(self._dispatch_message(m) for m in messages),
+                return_exceptions=True,
+            )
+            for result in results:
+                if isinstance(result, Exception):
+                    # One failing message shouldn't block the rest of the
+                    # batch; log it and keep the others' results.
+                    logger.error("Error handling batched message: %s", result)
+            return {"status": "ok", "processed": len(results)}
+
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error("Error in webhook: %s", e)
+            raise HTTPException(status_code=500, detail=str(e))
 
-            # Process message by type
+    async def _dispatch_message(self, message_data: dict):
+        """Route one extracted message to its typed handler."""
+        async with self._dispatch_sem:
             msg_type = message_data.get("type", "")
+            if msg_type == "status":
+                return {"status": "ok", "type": "status_update"}
             if msg_type == "document":
                 return await self.handle_document(message_data)
-            elif msg_type == "text":
+            if msg_type == "text":
                 return await self.handle_text(message_data)
-            elif msg_type == "image":
+            if msg_type == "image":
                 await self.whatsapp.send_message(
                     message_data["from"],
                     "Sorry, I can only process PDF files, not images.",
                 )
                 return {"status": "rejected", "type": "unsupported_file_type"}
-
             return {"status": "unsupported_message_type"}
 
-        except HTTPException:
-            raise
-        except Exception as e:
-            logging.error(f"Error in webhook: {str(e)}")
-            raise HTTPException(status_code=500, detail=str(e))
+    def _is_duplicate_message(self, message_id) -> bool:
+        """Idempotency guard for webhook retries.
+
+        Twilio delivers at-least-once, so a slow reply can trigger a retry
+        with the same MessageSid; replaying it would mean duplicate LLM
+        calls and duplicate outbound messages. First sighting records the
+        id (bounded LRU) and returns False; repeats return True.
+        """
+        if not message_id:
+            return False
+        if message_id in self._seen_message_ids:
+            return True
+        self._seen_message_ids[message_id] = None
+        if len(self._seen_message_ids) > self.SEEN_MESSAGES_MAX:
+            self._seen_message_ids.popitem(last=False)
+        return False
+
+    def _cached_user_state(self, user_id):
+        """Return the cached (UserState, pdf_id) pair, or None on miss/expiry."""
+        entry = self._user_state_cache.get(user_id)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if time.monotonic() >= expires_at:
+            del self._user_state_cache[user_id]
+            return None
+        return value
+
+    def _cache_user_state(self, user_id, user_state, pdf_id) -> None:
+        self._user_state_cache[user_id] = (
+            time.monotonic() + self.USER_STATE_CACHE_TTL,
+            (user_state, pdf_id),
+        )
+        self._user_state_cache.move_to_end(user_id)
+        while len(self._user_state_cache) > self.USER_STATE_CACHE_MAX:
+            self._user_state_cache.popitem(last=False)
+
+    def _invalidate_user_state(self, user_id) -> None:
+        self._user_state_cache.pop(user_id, None)
+
+    async def _bg_send(self, user_id: str, text: str) -> None:
+        """Send a non-critical message without blocking the caller.
+
+        Progress acks don't need to hold up database work, so they run as
+        their own task and overlap the Twilio round-trip with whatever the
+        handler does next. Past the cap the send is awaited inline instead,
+        as backpressure against unbounded task growth.
+        """
+        if len(self._bg_tasks) >= 64:
+            await self.whatsapp.send_message(user_id, text)
+            return
+        task = asyncio.create_task(self.whatsapp.send_message(user_id, text))
+        self._bg_tasks.add(task)
+        task.add_done_callback(self._bg_tasks.discard)
 
     async def handle_document(self, message_data: dict):
         """Handle document (PDF) messages and reject non-PDF files"""
+        if self._is_duplicate_message(message_data.get("message_id")):
+            return {"status": "duplicate"}
+
         document = message_data["document"]
         mime_type = document["mime_type"]
         user_id = message_data["from"]
 
-        pdf_bytes = await self.pdf_processor.download_pdf_from_whatsapp(document)
-
+        # Reject unsupported types before spending bandwidth on the download.
         if mime_type != "application/pdf":
             await self.whatsapp.send_message(
                 user_id, "Sorry, I can only process PDF files."
             )
             return {"status": "error", "type": "unsupported_document_type"}
 
-        # Download
-        pdf_bytes = await self.pdf_processor.download_pdf_from_whatsapp(document)
+        # Download (once — the bytes are reused across extraction retries).
+        # The streaming size cap aborts oversized transfers mid-flight
+        # instead of buffering them fully before the length check below.
+        try:
+            pdf_bytes = await self.pdf_processor.download_pdf_from_whatsapp(
+                document, max_bytes=self.MAX_FILE_SIZE
+            )
+        except MediaTooLargeError:
+            await self.whatsapp.send_message(
+                user_id,
+                f"Sorry, the file is too large (over {self.MAX_FILE_SIZE // 1_048_576} MB).",
+            )
+            return {"status": "error", "type": "file_too_large"}
         filename = document.get("filename") or "document.pdf"
 
         # Continue with PDF processing
         try:
-            await self.whatsapp.send_message(
-                user_id, f"Processing your PDF: {filename}..."
-            )
+            # Fire-and-forget: the ack overlaps the DB work below.
+            await self._bg_send(user_id, f"Processing your PDF: {filename}...")
             if len(pdf_bytes) > self.MAX_FILE_SIZE:
                 await self.whatsapp.send_message(
                     user_id,
@@ -111,98 +332,122 @@ class WebhookService:
                 )
                 return {"status": "error", "type": "file_too_large"}
 
-            # Check and manage file limit
+            # One session — a single pool checkout — covers the limit check,
+            # the insert and the content update. Transactions stay short:
+            # nothing is left uncommitted across the slow extract/embed work
+            # below, which would hold SQLite's write lock and stall every
+            # other handler's commit.
             with Session(engine) as session:
-                # Count user's documents
-                user_docs_count = session.exec(
-                    select(func.count(PDFDocument.id)).where(
-                        PDFDocument.user_id == user_id
+                # Re-uploads of the same bytes skip extraction and indexing
+                # — the most expensive work in this handler — and just
+                # reactivate the existing document.
+                content_hash = hashlib.blake2b(pdf_bytes, digest_size=16).hexdigest()
+                existing_id = session.exec(
+                    select(PDFDocument.id)
+                    .where(
+                        PDFDocument.user_id == user_id,
+                        PDFDocument.content_hash == content_hash,
+                    )
+                    .limit(1)
+                ).first()
+                if existing_id is not None:
+                    self._set_user_state(session, user_id, "active", existing_id)
+                    await self.whatsapp.send_message(
+                        user_id,
+                        f"You've already uploaded {filename} — it's selected and ready for questions.",
+                    )
+                    return {"status": "success", "type": "document"}
+
+                # Enforce the 10-document cap in one statement: everything
+                # older than the user's newest 9 documents is deleted so the
+                # insert below fits, replacing the COUNT + SELECT + DELETE
+                # sequence (three round-trips) with a single one.
+                overflow = (
+                    select(PDFDocument.id)
+                    .where(PDFDocument.user_id == user_id)
+                    .order_by(PDFDocument.upload_date.desc())
+                    .offset(9)
+                )
+                evicted = session.exec(
+                    delete(PDFDocument).where(PDFDocument.id.in_(overflow))
+                )
+                if evicted.rowcount:
+                    session.commit()
+                    logger.info(
+                        "Deleted %s oldest document(s) for user %s",
+                        evicted.rowcount,
+                        user_id,
                     )
-                ).one()
-
-                # If at limit, delete oldest document
-                if user_docs_count >= 10:
-                    oldest_doc = session.exec(
-                        select(PDFDocument)
-                        .where(PDFDocument.user_id == user_id)
-                        .order_by(PDFDocument.upload_date)
-                        .limit(1)
-                    ).first()
-
-                    if oldest_doc:
-                        session.delete(oldest_doc)
-                        session.commit()
-                        logging.info(
-                            f"Deleted oldest document {oldest_doc.filename} for user {user_id}"
-                        )
 
-                # Store new PDF in database
+                # Store the placeholder row and commit it immediately:
+                # extraction and embedding take seconds, and an open write
+                # transaction across them would block every concurrent
+                # handler ("database is locked" on SQLite).
                 pdf_doc = PDFDocument(
                     filename=filename,
                     content="",
                     user_id=user_id,
+                    content_hash=content_hash,
                     whatsapp_file_id=document.get("id"),
                 )
                 session.add(pdf_doc)
                 session.commit()
                 doc_id = pdf_doc.id
 
-            # Try processing up to 3 times
-            max_retries = 2
-            for attempt in range(max_retries + 1):
-                try:
-                    # Process the already downloaded PDF content
-                    pdf_text = self.pdf_processor.extract_text_from_bytes(pdf_bytes)
-
-                    # Update database with content
-                    with Session(engine) as session:
-                        pdf_doc = session.get(PDFDocument, doc_id)
-                        if pdf_doc:
-                            pdf_doc.content = pdf_text
-                            session.add(pdf_doc)
-                            session.commit()
+                # Try processing up to 3 times
+                max_retries = 2
+                for attempt in range(max_retries + 1):
+                    try:
+                        # Extraction is CPU-bound; run it off the event loop
+                        # so other webhooks keep being served meanwhile.
+                        pdf_text = await asyncio.to_thread(
+                            self.pdf_processor.extract_text_from_bytes, pdf_bytes
+                        )
 
+                        async with self._embed_sem:
                             await self.llm_service.process_document(
                                 pdf_text, str(doc_id)
                             )
 
-                            # Set this document as the active one for the user
-                            self._set_user_state(session, user_id, "active", doc_id)
+                        # Only now open the write transaction: content and
+                        # active-state land together in one short commit.
+                        pdf_doc.content = pdf_text
+                        session.add(pdf_doc)
+                        self._set_user_state(
+                            session, user_id, "active", doc_id, commit=False
+                        )
+                        session.commit()
 
-                            # Send completion message with examples
+                        # Send completion message with examples
+                        await self.whatsapp.send_message(
+                            user_id, PROCESSED_TEMPLATE.format(filename=filename)
+                        )
+                        return {"status": "success", "type": "document"}
+
+                    except Exception as e:
+                        logger.error(
+                            "Error processing document (attempt %s/%s): %s",
+                            attempt + 1,
+                            max_retries + 1,
+                            e,
+                        )
+                        if attempt == max_retries:
+                            # Remove the committed placeholder so a failed
+                            # upload doesn't leave an empty document behind.
+                            session.rollback()
+                            session.exec(
+                                delete(PDFDocument).where(PDFDocument.id == doc_id)
+                            )
+                            session.commit()
                             await self.whatsapp.send_message(
                                 user_id,
-                                f"I've finished processing your PDF: {filename}! 📄✓\n\n"
-                                f"The document should be ready for questions now, but it might take a moment to become fully searchable.\n\n"
-                                f"You can ask me things like:\n"
-                                f"- What is this document about?\n"
-                                f"- Summarize the main points\n"
-                                f"- Find information about a specific topic",
-                            )
-                            return {"status": "success", "type": "document"}
-                        else:
-                            # Handle case where pdf_doc is somehow None after getting ID
-                            logging.error(
-                                f"Could not retrieve PDFDocument with id {doc_id} after creation."
-                            )
-                            raise Exception(
-                                "Failed to retrieve PDF document from database after creation."
+                                f"Sorry, I've tried processing this PDF multiple times but encountered errors. "
+                                f"Please try a different PDF file or contact support if the issue persists.",
                             )
-
-                except Exception as e:
-                    logging.error(
-                        f"Error processing document (attempt {attempt + 1}/{max_retries + 1}): {str(e)}"
-                    )
-                    if attempt == max_retries:
-                        await self.whatsapp.send_message(
-                            user_id,
-                            f"Sorry, I've tried processing this PDF multiple times but encountered errors. "
-                            f"Please try a different PDF file or contact support if the issue persists.",
-                        )
-                        raise
+                            raise
 
         except Exception as e:
-            logging.error(f"Error processing document: {str(e)}")
+            logger.error("Error processing document: %s", e)
             await self.whatsapp.send_message(
                 user_id,
                 f"Sorry, I encountered an error while processing your PDF. Please try sending it again.",
@@ -222,10 +467,11 @@ class WebhookService:
                 session.commit()
                 doc_id = pdf_doc.id
 
-            with open(file_path, "rb") as f:
-                pdf_content = f.read()
-
-            pdf_text = self.pdf_processor.extract_text_from_bytes(pdf_content)
+            # File read and extraction both block; keep them off the loop.
+            pdf_content = await asyncio.to_thread(Path(file_path).read_bytes)
+            pdf_text = await asyncio.to_thread(
+                self.pdf_processor.extract_text_from_bytes, pdf_content
+            )
 
             with Session(engine) as session:
                 pdf_doc = session.get(PDFDocument, doc_id)
@@ -234,20 +480,28 @@ class WebhookService:
                     session.add(pdf_doc)
                     session.commit()
 
-                    await self.llm_service.process_document(pdf_text, str(doc_id))
+                    async with self._embed_sem:
+                        await self.llm_service.process_document(pdf_text, str(doc_id))
 
             return {"status": "success", "pdf_id": str(doc_id), "filename": filename}
 
         except Exception as e:
-            logging.error(f"Error processing uploaded PDF: {str(e)}")
+            logger.error("Error processing uploaded PDF: %s", e)
             raise HTTPException(
                 status_code=500, detail=f"PDF processing error: {str(e)}"
             )
 
     async def handle_text(self, message_data: dict):
         """Handle text messages"""
+        if self._is_duplicate_message(message_data.get("message_id")):
+            return {"status": "duplicate"}
+
         try:
-            message_text = message_data.get("message_body", "").lower()
+            # Keep the body as typed: lowercasing a whole message is wasted
+            # work, and it strips capitalization the retriever and the LLM
+            # rely on (proper nouns, acronyms). Commands and intent matching
+            # lowercase their own tokens.
+            message_text = message_data.get("message_body", "")
             user_id = message_data.get("from")
             user_name = message_data.get("name", "there")
 
@@ -255,39 +509,53 @@ class WebhookService:
             if message_text.startswith("/"):
                 return await self.handle_command(message_text, user_id, user_name)
 
-            # Check for special intents before proceeding to document queries
-            if await self.handle_special_intent(message_text, user_id, user_name):
-                return {"status": "success", "type": "intent_handled"}
-
-            # Get active PDF and check conversation state
+            # One session — a single pool checkout and transaction — serves
+            # every query and update this handler makes.
             with Session(engine) as session:
-                user_state = session.exec(
-                    select(UserState).where(UserState.user_id == user_id)
-                ).first()
-
-                # Initialize user state if none exists
-                if not user_state:
-                    user_state = UserState(user_id=user_id, state="new")
-                    session.add(user_state)
-                    session.commit()
-
-                # If user has an active document, use it
-                pdf_doc = None
-                if user_state and user_state.active_pdf_id:
-                    pdf_doc = session.get(PDFDocument, user_state.active_pdf_id)
-
-                if not pdf_doc:
-                    # If no active doc, try getting the latest uploaded one
-                    pdf_doc = session.exec(
-                        select(PDFDocument)
-                        .where(PDFDocument.user_id == user_id)
-                        .order_by(PDFDocument.upload_date.desc())
-                    ).first()
-                    # Update user state if we found a latest document
-                    if pdf_doc and user_state:
-                        self._set_user_state(
-                            session, user_id, user_state.state, pdf_doc.id
+                # Serve the state lookup from the in-process cache when
+                # possible; every write path invalidates the entry, so this
+                # mostly skips re-reading unchanged rows. awaiting_report
+                # entries are never served from cache — that branch mutates
+                # the row and needs a session-attached instance.
+                cached = self._cached_user_state(user_id)
+                if cached is not None and cached[0].state != "awaiting_report":
+                    user_state, pdf_id = cached
+                else:
+                    # One JOINed query returns the user's state together with
+                    # the document to answer from — the active one when it
+                    # still exists, otherwise the latest upload — replacing
+                    # the state SELECT, the active-pdf get and the latest-pdf
+                    # fallback (up to three round-trips) with a single one.
+                    row = session.exec(
+                        select(UserState, PDFDocument.id)
+                        .join(
+                            PDFDocument,
+                            PDFDocument.user_id == UserState.user_id,
+                            isouter=True,
+                        )
+                        .where(UserState.user_id == user_id)
+                        .order_by(
+                            (PDFDocument.id == UserState.active_pdf_id).desc(),
+                            PDFDocument.upload_date.desc(),
                         )
+                        .limit(1)
+                    ).first()
+
+                    if row is None:
+                        # First contact: initialize user state
+                        user_state = UserState(user_id=user_id, state="new")
+                        session.add(user_state)
+                        session.commit()
+                        pdf_id = None
+                    else:
+                        user_state, pdf_id = row
+                        # Remember a fallback choice so the next message hits
+                        # the active-document branch of the ordering directly.
+                        if pdf_id is not None and user_state.active_pdf_id != pdf_id:
+                            self._set_user_state(
+                                session, user_id, user_state.state, pdf_id
+                            )
+                        self._cache_user_state(user_id, user_state, pdf_id)
 
                 # Handle report
                 if user_state and user_state.state == "awaiting_report":
@@ -305,51 +573,60 @@ class WebhookService:
                     session.add(user_state)
                     # Don't delete user state, just update it
                     session.commit()
+                    self._invalidate_user_state(user_id)
 
                     await self.whatsapp.send_message(
                         user_id, "Thanks for your report. We'll investigate soon."
                     )
                     return {"status": "success", "type": "report_received"}
 
-            # Normal message handling
-            if pdf_doc and message_text:
-                # If we're here, the user is in an active conversation
-                # Update state to "active" if it's new or welcomed
-                if user_state and user_state.state in ["new", "welcomed"]:
-                    self._set_user_state(session, user_id, "active", pdf_doc.id)
+                # Intent matching only runs when there is no active document
+                # to answer from: in an active session nearly every message
+                # is a question about the PDF, so the hot path skips the
+                # keyword scan entirely. (Report text above is exempt too —
+                # an intent keyword inside a bug report shouldn't hijack it.)
+                if pdf_id is None or user_state.state in ("new", "welcomed"):
+                    if await self.handle_special_intent(
+                        message_text, user_id, user_name
+                    ):
+                        return {"status": "success", "type": "intent_handled"}
+
+                # Normal message handling
+                if pdf_id and message_text:
+                    # If we're here, the user is in an active conversation
+                    # Update state to "active" if it's new or welcomed
+                    if user_state and user_state.state in ["new", "welcomed"]:
+                        self._set_user_state(session, user_id, "active", pdf_id)
+
+                    # Directly ask LLMService for the answer based on the PDF
+                    async with self._answer_sem:
+                        answer = await self.llm_service.get_answer(
+                            message_text, str(pdf_id)
+                        )
+                    await self.whatsapp.send_message(user_id, answer["answer"])
 
-                # Directly ask LLMService for the answer based on the PDF
-                answer = await self.llm_service.get_answer(
-                    message_text, str(pdf_doc.id)
-                )
-                await self.whatsapp.send_message(user_id, answer["answer"])
-
-            else:
-                # Only send welcome message if state is "new"
-                if user_state.state == "new":
-                    # Set state to welcomed to prevent future welcome messages
-                    self._set_user_state(
-                        session, user_id, "welcomed"
-                    )  # No active PDF yet
-
-                    # Send welcome message
-                    response = (
-                        f"Hi {user_name}! 👋\n\n"
-                        f"I'm your smart PDF assistant. I can help you analyze and extract information from PDF files.\n\n"
-                        f"Please send me a PDF file to get started, and I'll help you understand what's inside!\n\n"
-                        f"Type /help to see all available commands."
-                    )
-                    await self.whatsapp.send_message(user_id, response)
-                else:  # State could be 'welcomed' or 'active' but pdf_doc is None
-                    # If state is not new but we have no PDF, remind them to upload
-                    await self.whatsapp.send_message(
-                        user_id,
-                        "I don't see any PDF files to analyze. Please upload a PDF file to continue, or use /list to select a previous one.",
-                    )
+                else:
+                    # Only send welcome message if state is "new"
+                    if user_state.state == "new":
+                        # Set state to welcomed to prevent future welcome messages
+                        self._set_user_state(
+                            session, user_id, "welcomed"
+                        )  # No active PDF yet
+
+                        # Send welcome message
+                        await self.whatsapp.send_message(
+                            user_id, WELCOME_TEMPLATE.format(name=user_name)
+                        )
+                    else:  # State could be 'welcomed' or 'active' but pdf_doc is None
+                        # If state is not new but we have no PDF, remind them to upload
+                        await self.whatsapp.send_message(
+                            user_id,
+                            "I don't see any PDF files to analyze. Please upload a PDF file to continue, or use /list to select a previous one.",
+                        )
 
             return {"status": "success", "type": "text"}
         except Exception as e:
-            logging.error(f"Error processing text: {str(e)}")
+            logger.error("Error processing text: %s", e)
             # Also send a message to the user in case of error during text processing
             user_id = message_data.get("from")
             if user_id:
@@ -366,182 +643,153 @@ class WebhookService:
         Handle special user intents that aren't directly related to document questions.
         Returns True if an intent was handled, False otherwise.
         """
-        # Convert to lowercase for easier matching
-        text = message_text.lower()
-
-        # Check for upload intent
-        upload_patterns = [
-            "upload",
-            "send",
-            "share",
-            "new file",
-            "another file",
-            "different file",
-            "add file",
-            "attach",
-        ]
-
-        if any(pattern in text for pattern in upload_patterns):
-            await self.whatsapp.send_message(
-                user_id,
-                "I'd be happy to help you with another file! Please send me the PDF you'd like to analyze next.",
-            )
-            return True
+        # One pass over the lowercased message; the earliest keyword match
+        # decides the intent.
+        match = _INTENT_RE.search(message_text.lower())
+        if match is None:
+            # No special intent detected
+            return False
 
-        # Check for thank you intent
-        thanks_patterns = ["thank", "thanks", "appreciate", "grateful"]
-        if any(pattern in text for pattern in thanks_patterns):
-            await self.whatsapp.send_message(
-                user_id,
-                "You're welcome! Let me know if you need help with anything else regarding your documents.",
-            )
-            return True
+        await self.whatsapp.send_message(user_id, _INTENT_REPLIES[match.lastgroup])
+        return True
 
-        # Check for capability questions
-        capability_patterns = [
-            "what can you do",
-            "help me",
-            "your abilities",
-            "your features",
-            "how do you work",
-        ]
-        if any(pattern in text for pattern in capability_patterns):
-            capabilities = (
-                f"I'm your PDF assistant! Here's what I can do:\n\n"
-                f"• Extract and analyze text from your PDF files\n"
-                f"• Answer questions about the content\n"
-                f"• Summarize key points\n"
-                f"• Find specific information\n\n"
-                f"Just upload a PDF and ask me anything about it!"
-            )
-            await self.whatsapp.send_message(user_id, capabilities)
-            return True
+    async def handle_command(self, command: str, user_id: str, user_name: str):
+        command = command.strip()
 
-        # No special intent detected
-        return False
+        # Only the command token is case-insensitive; arguments keep their case.
+        handler = self._command_handlers.get(command.split()[0].lower())
+        if handler is not None:
+            return await handler(command, user_id, user_name)
 
-    async def handle_command(self, command: str, user_id: str, user_name: str):
-        command = command.lower().strip()
+        await self.whatsapp.send_message(
+            user_id,
+            f"Sorry, I don't recognize that command. Type /help to see available commands.",
+        )
+        return {"status": "error", "command": "unknown"}
 
-        # Common database query for /list, /delete, /select
-        async def get_pdfs():
-            with Session(engine) as session:
-                pdfs = session.exec(
-                    select(PDFDocument)
-                    .where(PDFDocument.user_id == user_id)
-                    .order_by(PDFDocument.upload_date.desc())
-                ).all()
-                return session, pdfs
-
-        if command == "/help":
-            help_message = (
-                f"📚 *WhatsApp PDF Assistant Commands* 📚\n\n"
-                f"Send a PDF file to analyze it\n\n"
-                f"*Available commands:*\n"
-                f"/list - View your uploaded PDF files\n"
-                f"/select [number] - Select a PDF to ask questions about\n"
-                f"/delete [number] - Delete a PDF from your list\n"
-                f"/delete_all - Delete all your PDFs\n"
-                f"/report - Report a bug or issue\n"
-            )
-            await self.whatsapp.send_message(user_id, help_message)
-            return {"status": "success", "command": "help"}
-
-        elif command == "/list":
-            session, pdfs = await get_pdfs()
-            if not pdfs:
-                await self.whatsapp.send_message(user_id, "No PDFs uploaded yet.")
-                return {"status": "success", "command": "list"}
-
-            response = "Your PDF files:\n\n" + "\n".join(
-                f"{i}. {pdf.filename} ({pdf.upload_date.strftime('%b %d %H:%M')})"
-                for i, pdf in enumerate(pdfs, 1)
-            )
-            await self.whatsapp.send_message(user_id, response)
+    def _get_user_pdfs(self, session, user_id: str):
+        """Newest-first PDFs for a user; shared by /list, /select and /delete.
+
+        Selects only the columns the commands display so the (potentially
+        multi-MB) content text never leaves the database, and caps the
+        result well past the upload limit.
+        """
+        return session.exec(
+            select(PDFDocument.id, PDFDocument.filename, PDFDocument.upload_date)
+            .where(PDFDocument.user_id == user_id)
+            .order_by(PDFDocument.upload_date.desc())
+            .limit(50)
+        ).all()
+
+    async def _cmd_help(self, command: str, user_id: str, user_name: str):
+        await self.whatsapp.send_message(user_id, HELP_MESSAGE)
+        return {"status": "success", "command": "help"}
+
+    async def _cmd_list(self, command: str, user_id: str, user_name: str):
+        with Session(engine) as session:
+            pdfs = self._get_user_pdfs(session, user_id)
+
+        if not pdfs:
+            await self.whatsapp.send_message(user_id, "No PDFs uploaded yet.")
             return {"status": "success", "command": "list"}
 
-        elif command.startswith(("/delete ", "/select ")):
-            try:
-                idx = int(command.split(" ")[1]) - 1
-                session, pdfs = await get_pdfs()
+        response = "Your PDF files:\n\n" + "\n".join(
+            f"{i}. {pdf.filename} ({pdf.upload_date.strftime('%b %d %H:%M')})"
+            for i, pdf in enumerate(pdfs, 1)
+        )
+        await self.whatsapp.send_message(user_id, response)
+        return {"status": "success", "command": "list"}
+
+    async def _cmd_select_or_delete(self, command: str, user_id: str, user_name: str):
+        action = command[1:].split()[0].lower()
+        try:
+            idx = int(command.split(" ")[1]) - 1
+            with Session(engine) as session:
+                pdfs = self._get_user_pdfs(session, user_id)
 
                 if not pdfs or idx < 0 or idx >= len(pdfs):
                     await self.whatsapp.send_message(
                         user_id,
                         "Invalid selection. Please use /list to see available PDFs.",
                     )
-                    return {"status": "error", "command": command[1:].split()[0]}
+                    return {"status": "error", "command": action}
 
                 selected_pdf = pdfs[idx]
-                is_delete = command.startswith("/delete")
 
-                if is_delete:
-                    session.delete(selected_pdf)
+                if action == "delete":
+                    session.exec(
+                        delete(PDFDocument).where(PDFDocument.id == selected_pdf.id)
+                    )
                     self._set_user_state(session, user_id, "active", None)
                     msg = f"Deleted PDF: {selected_pdf.filename}"
                 else:
                     self._set_user_state(session, user_id, "active", selected_pdf.id)
                     msg = f"Selected: {selected_pdf.filename}\nYou can now ask questions about this PDF."
 
-                await self.whatsapp.send_message(user_id, msg)
-                return {"status": "success", "command": command[1:].split()[0]}
+            await self.whatsapp.send_message(user_id, msg)
+            return {"status": "success", "command": action}
 
-            except (ValueError, IndexError):
-                await self.whatsapp.send_message(
-                    user_id,
-                    f"Invalid command format. Use: {command.split()[0]} [number]",
-                )
-                return {"status": "error", "command": command[1:].split()[0]}
-
-        elif command == "/delete_all":
-            # Delete all PDFs for this user
-            with Session(engine) as session:
-                pdf_count = session.exec(
-                    select(func.count())
-                    .select_from(PDFDocument)
-                    .where(PDFDocument.user_id == user_id)
-                ).one()
-
-                if pdf_count == 0:
-                    await self.whatsapp.send_message(
-                        user_id, "You haven't uploaded any PDFs yet."
-                    )
-                    return {"status": "success", "command": "delete_all"}
+        except (ValueError, IndexError):
+            await self.whatsapp.send_message(
+                user_id,
+                f"Invalid command format. Use: {command.split()[0]} [number]",
+            )
+            return {"status": "error", "command": action}
+
+    async def _cmd_delete_all(self, command: str, user_id: str, user_name: str):
+        # Delete all PDFs for this user in one statement; the DELETE's own
+        # rowcount replaces the separate COUNT round-trip (and can't race
+        # against it).
+        with Session(engine) as session:
+            result = session.exec(
+                delete(PDFDocument).where(PDFDocument.user_id == user_id)
+            )
+            pdf_count = result.rowcount
 
-                session.exec(delete(PDFDocument).where(PDFDocument.user_id == user_id))
-                self._set_user_state(session, user_id, "active", None)
+            if pdf_count == 0:
                 await self.whatsapp.send_message(
-                    user_id, f"All your PDFs have been deleted ({pdf_count} files)."
+                    user_id, "You haven't uploaded any PDFs yet."
                 )
                 return {"status": "success", "command": "delete_all"}
 
-        elif command == "/report":
-            with Session(engine) as session:
-                self._set_user_state(session, user_id, "awaiting_report")
+            self._set_user_state(session, user_id, "active", None)
             await self.whatsapp.send_message(
-                user_id,
-                "I'm sorry you encountered an issue. Please describe the problem in detail, and our team will look into it.",
+                user_id, f"All your PDFs have been deleted ({pdf_count} files)."
             )
-            return {"status": "success", "command": "report_started"}
+            return {"status": "success", "command": "delete_all"}
 
+    async def _cmd_report(self, command: str, user_id: str, user_name: str):
+        with Session(engine) as session:
+            self._set_user_state(session, user_id, "awaiting_report")
         await self.whatsapp.send_message(
             user_id,
-            f"Sorry, I don't recognize that command. Type /help to see available commands.",
+            "I'm sorry you encountered an issue. Please describe the problem in detail, and our team will look into it.",
         )
-        return {"status": "error", "command": "unknown"}
-
-    def _set_user_state(self, session, user_id, state, active_pdf_id=None):
-        user_state = session.exec(
-            select(UserState).where(UserState.user_id == user_id)
-        ).first()
-        if user_state:
-            user_state.state = state
-            # Only update active_pdf_id if provided, otherwise keep existing
-            if active_pdf_id is not None:
-                user_state.active_pdf_id = active_pdf_id
-            session.add(user_state)
-        else:
-            session.add(
-                UserState(user_id=user_id, state=state, active_pdf_id=active_pdf_id)
-            )
-        session.commit()
+        return {"status": "success", "command": "report_started"}
+
+    def _set_user_state(self, session, user_id, state, active_pdf_id=None, commit=True):
+        # Single-statement UPSERT: one round-trip instead of SELECT then
+        # INSERT/UPDATE, and atomic when concurrent webhooks race on the
+        # same user. COALESCE keeps the stored active_pdf_id when no new
+        # one is provided, matching the old "only update if given" rule.
+        insert = _pg_insert if engine.dialect.name == "postgresql" else _sqlite_insert
+        stmt = insert(UserState).values(
+            user_id=user_id, state=state, active_pdf_id=active_pdf_id
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["user_id"],
+            set_={
+                "state": stmt.excluded.state,
+                "active_pdf_id": func.coalesce(
+                    stmt.excluded.active_pdf_id, UserState.active_pdf_id
+                ),
+            },
+        )
+        session.exec(stmt)
+        # commit=False lets callers fold the state change into their own
+        # transaction instead of forcing an extra commit here.
+        if commit:
+            session.commit()
+        # Drop the cached snapshot so the next text message re-reads the
+        # state this write just changed.
+        self._invalidate_user_state(user_id)
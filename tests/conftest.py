@@ -59,6 +59,33 @@ def pdf_upload_file(sample_pdf):
     return UploadFile(filename="test.pdf", file=BytesIO(sample_pdf))
 
 
+@pytest.fixture(autouse=True)
+def isolate_embedding_cache(tmp_path, monkeypatch):
+    """Point the on-disk embedding/vectorstore caches at per-test directories."""
+    from app.services.langchain_service import LLMService
+
+    monkeypatch.setattr(
+        LLMService, "EMBEDDING_CACHE_DIR", str(tmp_path / "embeddings")
+    )
+    monkeypatch.setattr(
+        LLMService, "VECTORSTORE_CACHE_DIR", str(tmp_path / "vectorstores")
+    )
+
+
+@pytest.fixture(autouse=True)
+def reset_seen_message_ids():
+    """Clear the webhook service's duplicate-message LRU between tests.
+
+    The route module holds a single WebhookService instance and the form
+    fixtures reuse the same MessageSid, so without this each test after the
+    first would be treated as a webhook retry.
+    """
+    from app.routes.webhook import webhook_service
+
+    webhook_service._seen_message_ids.clear()
+    webhook_service._user_state_cache.clear()
+
+
 @pytest.fixture(autouse=True)
 def ignore_pypdf_warnings():
     """Ignore warnings from pypdf."""
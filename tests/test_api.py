@@ -112,6 +112,42 @@ def test_webhook_unsupported_media_twilio(
     # Here we could verify the error message content if needed
 
 
+# Test that inbound messages carrying SmsStatus=received are still processed
+@patch("app.core.twilio_whatsapp_client.TwilioWhatsAppClient.send_message")
+@patch("app.services.webhook_service.WebhookService.handle_text")
+def test_webhook_inbound_sms_status_received(
+    mock_handle_text, mock_send_message, client, twilio_webhook_form_data
+):
+    """Twilio inbound messages include SmsStatus=received alongside Body."""
+    mock_send_message.return_value = {"sid": "test_sid"}
+    mock_handle_text.return_value = {"status": "success"}
+
+    form_data = twilio_webhook_form_data(body="hello there")
+    form_data["SmsStatus"] = "received"
+
+    response = client.post("/webhook", data=form_data)
+
+    # Must not be mistaken for a delivery-status callback
+    assert response.status_code == 200
+    mock_handle_text.assert_called_once()
+
+
+# Test that delivery-status callbacks are acknowledged without processing
+@patch("app.services.webhook_service.WebhookService.handle_text")
+def test_webhook_delivery_status_callback(mock_handle_text, client):
+    """Status callbacks (e.g. delivered) get a 204 and no message handling."""
+    form_data = {
+        "MessageSid": "SM123456789",
+        "MessageStatus": "delivered",
+        "From": "whatsapp:123456789",
+    }
+
+    response = client.post("/webhook", data=form_data)
+
+    assert response.status_code == 204
+    mock_handle_text.assert_not_called()
+
+
 # Test receiving a webhook with missing From parameter
 def test_webhook_missing_from(client):
     """Test webhook requires 'From' field"""
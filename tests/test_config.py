@@ -159,24 +159,23 @@ def test_dotenv_loading_success(mock_load_dotenv, monkeypatch):
     assert call_args.kwargs.get("override") is True
 
 
-def test_dotenv_loading_importerror(monkeypatch, capsys):
+def test_dotenv_loading_importerror(monkeypatch, caplog):
     """Test handling when python-dotenv is not installed."""
     monkeypatch.delenv("WEBSITE_SITE_NAME", raising=False)
     import app.core.config
 
     # Simulate ImportError during 'from dotenv import load_dotenv'
-    with patch.dict(sys.modules, {"dotenv": None}):
+    with patch.dict(sys.modules, {"dotenv": None}), caplog.at_level(logging.WARNING):
         importlib.reload(app.core.config)
 
-    # load_dotenv should NOT have been called, check the print output
-    captured = capsys.readouterr()
-    assert "python-dotenv not found" in captured.out
+    # load_dotenv should NOT have been called, check the log output
+    assert "python-dotenv not found" in caplog.text
 
 
 @patch(
     "dotenv.load_dotenv", side_effect=Exception("File permission error"), create=True
 )
-def test_dotenv_loading_general_exception(mock_load_dotenv, monkeypatch, capsys):
+def test_dotenv_loading_general_exception(mock_load_dotenv, monkeypatch, caplog):
     """Test handling general exceptions during .env loading."""
     monkeypatch.delenv("WEBSITE_SITE_NAME", raising=False)
     # Ensure dotenv module itself is available for patching/importing
@@ -187,11 +186,11 @@ def test_dotenv_loading_general_exception(mock_load_dotenv, monkeypatch, capsys)
 
     import app.core.config
 
-    importlib.reload(app.core.config)
+    with caplog.at_level(logging.WARNING):
+        importlib.reload(app.core.config)
 
     mock_load_dotenv.assert_called_once()  # Check it was attempted
-    captured = capsys.readouterr()
-    assert "Error loading .env file: File permission error" in captured.out
+    assert "Error loading .env file: File permission error" in caplog.text
 
 
 @patch("dotenv.load_dotenv", create=True)
@@ -1,8 +1,16 @@
 # tests/test_database.py
 
 import pytest
-from sqlmodel import Session, SQLModel
-from app.core.database import engine, init_db, get_db, DATABASE_URL, get_async_session
+from sqlalchemy import inspect
+from sqlmodel import Session, SQLModel, create_engine
+from app.core.database import (
+    engine,
+    init_db,
+    get_db,
+    DATABASE_URL,
+    get_async_session,
+    _run_schema_migrations,
+)
 from app.data_schemas import PDFDocument
 from app import create_app
 
@@ -143,6 +151,46 @@ async def test_async_session_rollback():
             raise Exception("Test error")
 
 
+def test_schema_migrations_upgrade_old_database():
+    """Old databases gain content_hash and the unique user_id index."""
+    old_engine = create_engine("sqlite://")
+    with old_engine.begin() as conn:
+        # Pre-content_hash schema, and userstate without the unique index
+        # (including duplicate rows that would violate it)
+        conn.exec_driver_sql(
+            "CREATE TABLE pdfdocument (id INTEGER PRIMARY KEY, filename VARCHAR, "
+            "content VARCHAR, upload_date DATETIME, user_id VARCHAR, "
+            "whatsapp_file_id VARCHAR, processed BOOLEAN)"
+        )
+        conn.exec_driver_sql(
+            "CREATE TABLE userstate (id INTEGER PRIMARY KEY, user_id VARCHAR, "
+            "state VARCHAR, active_pdf_id INTEGER)"
+        )
+        conn.exec_driver_sql(
+            "INSERT INTO userstate (user_id, state) VALUES "
+            "('u1', 'new'), ('u1', 'active'), ('u2', 'welcomed')"
+        )
+
+    _run_schema_migrations(old_engine)
+
+    inspector = inspect(old_engine)
+    columns = {c["name"] for c in inspector.get_columns("pdfdocument")}
+    assert "content_hash" in columns
+    assert any(
+        index["unique"] and index["column_names"] == ["user_id"]
+        for index in inspector.get_indexes("userstate")
+    )
+    with old_engine.connect() as conn:
+        rows = conn.exec_driver_sql(
+            "SELECT user_id, state FROM userstate ORDER BY user_id"
+        ).fetchall()
+    # Duplicates collapsed to the newest row per user
+    assert rows == [("u1", "active"), ("u2", "welcomed")]
+
+    # Running again is a no-op
+    _run_schema_migrations(old_engine)
+
+
 def test_init_db():
     """Test database initialization"""
     # Drop all tables first
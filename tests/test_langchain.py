@@ -2,7 +2,7 @@
 
 import pytest
 from app.services.langchain_service import LLMService
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, AsyncMock
 from langchain_core.prompts import ChatPromptTemplate
 
 
@@ -17,12 +17,12 @@ async def test_process_document(llm_service):
     doc_id = "test_123"
 
     with patch(
-        "langchain_openai.embeddings.base.OpenAIEmbeddings.embed_documents"
+        "langchain_openai.embeddings.base.OpenAIEmbeddings.aembed_documents",
+        new=AsyncMock(return_value=[[0.1] * 1536]),
     ) as mock_embed:
-        mock_embed.return_value = [[0.1] * 1536]
         vectorstore = await llm_service.process_document(test_text, doc_id)
         assert vectorstore is not None
-        mock_embed.assert_called_once()
+        mock_embed.assert_awaited_once()
 
 
 @pytest.mark.asyncio
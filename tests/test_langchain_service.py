@@ -2,7 +2,7 @@
 
 import pytest
 from app.services.langchain_service import LLMService, State, Message
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, AsyncMock
 import os
 from langgraph.types import interrupt
 from langchain.prompts import ChatPromptTemplate
@@ -55,39 +55,41 @@ async def test_validate_document(llm_service, tmp_path):
 
     # Test valid PDF
     state = State(file_path=str(pdf_path))
-    with patch("pypdf.PdfReader") as mock_reader:
-        mock_reader.return_value.pages = [MagicMock()]
-        mock_reader.return_value.pages[0].extract_text.return_value = "test content"
-        result = llm_service.validate_document(state)
-        assert result.document_valid is True
+    with patch("app.services.langchain_service.fitz.open") as mock_open:
+        mock_open.return_value.page_count = 1
+        mock_open.return_value.load_page.return_value.get_text.return_value = (
+            "test content"
+        )
+        result = await llm_service.validate_document(state)
+        assert result["document_valid"] is True
 
     # Test non-existent file
     state = State(file_path="nonexistent.pdf")
-    result = llm_service.validate_document(state)
-    assert result.document_valid is False
-    assert "does not exist" in result.response
+    result = await llm_service.validate_document(state)
+    assert result["document_valid"] is False
+    assert "does not exist" in result["response"]
 
     # Test non-PDF file
     txt_path = tmp_path / "test.txt"
     txt_path.write_text("test")
     state = State(file_path=str(txt_path))
-    result = llm_service.validate_document(state)
-    assert result.document_valid is False
-    assert "not a PDF file" in result.response
+    result = await llm_service.validate_document(state)
+    assert result["document_valid"] is False
+    assert "not a PDF file" in result["response"]
 
 
 def test_handle_invalid_document(llm_service):
     # Test with error message
     state = State(file_path="test.pdf", response="Invalid file", messages=[])
     result = llm_service.handle_invalid_document(state)
-    assert result.file_path == ""
-    assert any(msg.content == "Invalid file" for msg in result.messages)
+    assert result["file_path"] == ""
+    assert any(msg.content == "Invalid file" for msg in result["messages"])
 
     # Test without error message - need to provide default message
     state = State(file_path="test.pdf", messages=[], response="")
     result = llm_service.handle_invalid_document(state)
-    assert result.file_path == ""
-    assert len(result.messages) > 0
+    assert result["file_path"] == ""
+    assert len(result["messages"]) > 0
 
 
 def test_check_next_action(llm_service):
@@ -111,27 +113,27 @@ def test_request_question(llm_service):
     with patch("app.services.langchain_service.interrupt") as mock_interrupt:
         mock_interrupt.return_value = None
         result = llm_service.request_question(state)
-        assert result.file_path == "test.pdf"
-        assert len(result.messages) > 0
+        assert "file_path" not in result
+        assert len(result["messages"]) > 0
 
     # Test with "end" command
     with patch("app.services.langchain_service.interrupt") as mock_interrupt:
         mock_interrupt.return_value = "end"
         result = llm_service.request_question(state)
-        assert result.command == "end"
+        assert result["command"] == "end"
 
     # Test with "new" command
     with patch("app.services.langchain_service.interrupt") as mock_interrupt:
         mock_interrupt.return_value = "new"
         result = llm_service.request_question(state)
-        assert result.command == "new"
-        assert result.file_path == ""
+        assert result["command"] == "new"
+        assert result["file_path"] == ""
 
     # Test with regular question
     with patch("app.services.langchain_service.interrupt") as mock_interrupt:
         mock_interrupt.return_value = "What is this about?"
         result = llm_service.request_question(state)
-        assert result.messages[-1].content == "What is this about?"
+        assert result["messages"][-1].content == "What is this about?"
 
 
 def test_process_document_sync(llm_service):
@@ -148,21 +150,22 @@ def test_process_document_sync(llm_service):
         assert file_path in llm_service._vectorstores
 
 
-def test_generate_response(llm_service):
+@pytest.mark.asyncio
+async def test_generate_response(llm_service):
     # Test with invalid document
     state = State(document_valid=False)
-    result = llm_service.generate_response(state)
-    assert result == state
+    result = await llm_service.generate_response(state)
+    assert result == {}
 
     # Test with no user message
     state = State(document_valid=True, messages=[])
-    result = llm_service.generate_response(state)
-    assert result == state
+    result = await llm_service.generate_response(state)
+    assert result == {}
 
     # Test with command message
     state = State(document_valid=True, messages=[Message(role="user", content="end")])
-    result = llm_service.generate_response(state)
-    assert result == state
+    result = await llm_service.generate_response(state)
+    assert result == {}
 
     # Test with missing vectorstore
     state = State(
@@ -170,8 +173,8 @@ def test_generate_response(llm_service):
         file_path="nonexistent.pdf",
         messages=[Message(role="user", content="test question")],
     )
-    result = llm_service.generate_response(state)
-    assert "Document not properly loaded" in result.response
+    result = await llm_service.generate_response(state)
+    assert "Document not properly loaded" in result["response"]
 
     # Test successful case
     state = State(
@@ -181,23 +184,21 @@ def test_generate_response(llm_service):
     )
     llm_service._vectorstores["test.pdf"] = MagicMock()
 
-    # Mock the retriever and chain response
-    mock_retriever = MagicMock()
+    # Mock the scored search and chain response
     mock_document = MagicMock()
     mock_document.page_content = "test content"
-    mock_retriever.invoke.return_value = [mock_document]
 
     with patch.object(
         llm_service._vectorstores["test.pdf"],
-        "as_retriever",
-        return_value=mock_retriever,
+        "similarity_search_with_score",
+        return_value=[(mock_document, 0.1)],
     ):
         with patch(
-            "langchain_core.output_parsers.StrOutputParser.invoke",
-            return_value="Test response",
+            "langchain_core.output_parsers.StrOutputParser.ainvoke",
+            new=AsyncMock(return_value="Test response"),
         ):
-            result = llm_service.generate_response(state)
-            assert result.response == "Test response"
+            result = await llm_service.generate_response(state)
+            assert result["response"] == "Test response"
 
 
 @pytest.mark.asyncio
@@ -208,19 +209,17 @@ async def test_get_answer(llm_service):
 
     # Test with existing vectorstore
     llm_service._vectorstores["test_id"] = MagicMock()
-    mock_retriever = MagicMock()
     mock_document = MagicMock()
     mock_document.page_content = "test content"
-    mock_retriever.invoke.return_value = [mock_document]
 
     with patch.object(
         llm_service._vectorstores["test_id"],
-        "as_retriever",
-        return_value=mock_retriever,
+        "similarity_search_with_score",
+        return_value=[(mock_document, 0.1)],
     ):
         with patch(
-            "langchain_core.output_parsers.StrOutputParser.invoke",
-            return_value="Test answer",
+            "langchain_core.output_parsers.StrOutputParser.ainvoke",
+            new=AsyncMock(return_value="Test answer"),
         ):
             result = await llm_service.get_answer("test question", "test_id")
             assert result["answer"] == "Test answer"
@@ -228,22 +227,54 @@ async def test_get_answer(llm_service):
     # Test with exception
     with patch.object(
         llm_service._vectorstores["test_id"],
-        "as_retriever",
+        "similarity_search_with_score",
         side_effect=Exception("Test error"),
     ):
         result = await llm_service.get_answer("test question", "test_id")
         assert "error" in result["answer"].lower()
 
 
+@pytest.mark.asyncio
+async def test_stream_answer(llm_service):
+    # Unknown document raises
+    with pytest.raises(ValueError):
+        async for _ in llm_service.stream_answer("test question", "missing_id"):
+            pass
+
+    # Known document streams chunks from the chain
+    llm_service._vectorstores["stream_id"] = MagicMock()
+    mock_document = MagicMock()
+    mock_document.page_content = "test content"
+
+    async def fake_astream(inputs):
+        yield "Test "
+        yield "stream"
+
+    with patch.object(
+        llm_service._vectorstores["stream_id"],
+        "similarity_search_with_score",
+        return_value=[(mock_document, 0.1)],
+    ):
+        with patch.object(llm_service, "_answer_chain") as mock_chain:
+            mock_chain.astream = fake_astream
+            chunks = [
+                chunk
+                async for chunk in llm_service.stream_answer(
+                    "test question", "stream_id"
+                )
+            ]
+            assert "".join(chunks) == "Test stream"
+
+
 def test_initialize_context(llm_service):
     # Test without file path
     with patch("app.services.langchain_service.interrupt") as mock_interrupt:
         mock_interrupt.return_value = "test.pdf"
         state = State(file_path="", messages=[])
         result = llm_service.initialize_context(state)
-        assert result.file_path == "test.pdf"
+        assert result["file_path"] == "test.pdf"
 
-    # Test with existing file path
+    # Test with existing file path: nothing changes
     state = State(file_path="already_set.pdf", messages=[])
     result = llm_service.initialize_context(state)
-    assert result.file_path == "already_set.pdf"
+    assert result == {}
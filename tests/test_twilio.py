@@ -46,21 +46,36 @@ async def test_send_message():
     )
 
 
+def _mock_streaming_client(headers, chunks):
+    """Build a mock AsyncClient whose stream() yields the given chunks."""
+    mock_response = MagicMock()
+    mock_response.raise_for_status = MagicMock()
+    mock_response.headers = headers
+
+    async def aiter_bytes(chunk_size):
+        for chunk in chunks:
+            yield chunk
+
+    mock_response.aiter_bytes = aiter_bytes
+
+    mock_stream = MagicMock()
+    mock_stream.__aenter__ = AsyncMock(return_value=mock_response)
+    mock_stream.__aexit__ = AsyncMock(return_value=None)
+
+    mock_client = MagicMock()
+    mock_client.stream = MagicMock(return_value=mock_stream)
+    return mock_client
+
+
 @pytest.mark.asyncio
 async def test_download_media():
     client = TwilioWhatsAppClient(
         sid="test_sid", token="test_token", from_number="1234567890"
     )
 
-    # Mock httpx client response
-    mock_response = MagicMock()
-    mock_response.raise_for_status = MagicMock()
-    mock_response.content = b"test content"
-    mock_response.headers = {"content-disposition": "attachment; filename=test.pdf"}
-
-    # Mock AsyncClient.get method
-    mock_client = MagicMock()
-    mock_client.__aenter__.return_value.get.return_value = mock_response
+    mock_client = _mock_streaming_client(
+        {"content-disposition": "attachment; filename=test.pdf"}, [b"test content"]
+    )
 
     with patch("httpx.AsyncClient", return_value=mock_client):
         content, filename = await client.download_media("https://example.com/test.pdf")
@@ -69,9 +84,9 @@ async def test_download_media():
         assert content == b"test content"
         assert filename == "test.pdf"
 
-        # Verify the get call
-        mock_client.__aenter__.return_value.get.assert_called_once_with(
-            "https://example.com/test.pdf", auth=("test_sid", "test_token")
+        # Verify the stream call
+        mock_client.stream.assert_called_once_with(
+            "GET", "https://example.com/test.pdf", auth=("test_sid", "test_token")
         )
 
 
@@ -81,15 +96,8 @@ async def test_download_media_no_filename():
         sid="test_sid", token="test_token", from_number="1234567890"
     )
 
-    # Mock httpx client response with no content-disposition header
-    mock_response = MagicMock()
-    mock_response.raise_for_status = MagicMock()
-    mock_response.content = b"test content"
-    mock_response.headers = {}
-
-    # Mock AsyncClient.get method
-    mock_client = MagicMock()
-    mock_client.__aenter__.return_value.get.return_value = mock_response
+    # No content-disposition header
+    mock_client = _mock_streaming_client({}, [b"test content"])
 
     with patch("httpx.AsyncClient", return_value=mock_client):
         content, filename = await client.download_media("https://example.com/test.pdf")
@@ -97,3 +105,24 @@ async def test_download_media_no_filename():
         # Verify the response
         assert content == b"test content"
         assert filename == "document.pdf"  # Default filename
+
+
+@pytest.mark.asyncio
+async def test_download_media_too_large():
+    from app.core.twilio_whatsapp_client import MediaTooLargeError
+
+    client = TwilioWhatsAppClient(
+        sid="test_sid", token="test_token", from_number="1234567890"
+    )
+
+    # Declared length over the cap: rejected before any body is read
+    mock_client = _mock_streaming_client({"content-length": "100"}, [b"x" * 100])
+    with patch("httpx.AsyncClient", return_value=mock_client):
+        with pytest.raises(MediaTooLargeError):
+            await client.download_media("https://example.com/big.pdf", max_bytes=50)
+
+    # No declared length: aborted as soon as the stream passes the cap
+    mock_client = _mock_streaming_client({}, [b"x" * 40, b"x" * 40])
+    with patch("httpx.AsyncClient", return_value=mock_client):
+        with pytest.raises(MediaTooLargeError):
+            await client.download_media("https://example.com/big.pdf", max_bytes=50)
@@ -297,12 +297,6 @@ async def test_handle_command_report(webhook_service):
         mock_session_instance.__enter__.return_value = mock_session_instance
         mock_session_instance.__exit__.return_value = None
 
-        # Configure instance methods (e.g., exec)
-        # Simulate finding no existing user state initially in _set_user_state
-        mock_exec_chain_state = MagicMock()
-        mock_exec_chain_state.first.return_value = None
-        mock_session_instance.exec.return_value = mock_exec_chain_state
-
         # --- Execute the service method ---
         result = await webhook_service.handle_command("/report", "55555", "Reporter")
         # --- End execution ---
@@ -312,14 +306,9 @@ async def test_handle_command_report(webhook_service):
     assert result["command"] == "report_started"
 
     # Check calls on the mock session instance
-    # Verify _set_user_state found no state initially
+    # _set_user_state issues a single UPSERT statement
     mock_session_instance.exec.assert_called_once()
-    # Check user state was added
-    assert mock_session_instance.add.call_count == 1
-    added_obj = mock_session_instance.add.call_args[0][0]
-    assert isinstance(added_obj, UserState)
-    assert added_obj.user_id == "55555"
-    assert added_obj.state == "awaiting_report"
+    mock_session_instance.add.assert_not_called()
     mock_session_instance.commit.assert_called_once()
 
     # Check confirmation message was sent
@@ -368,15 +357,13 @@ async def test_handle_text_report_submission(webhook_service):
         mock_session_instance.__exit__.return_value = None
 
         # Configure instance methods
-        # Simulate finding the UserState in 'awaiting_report'
+        # The JOINed lookup finds the UserState in 'awaiting_report' with no
+        # document to go with it
         mock_user_state = UserState(user_id="55555", state="awaiting_report")
-        # Simulate finding no active PDF document afterwards
-        mock_session_instance.exec.side_effect = [
-            MagicMock(
-                first=MagicMock(return_value=mock_user_state)
-            ),  # First exec finds state
-            MagicMock(first=MagicMock(return_value=None)),  # Second exec finds no PDF
-        ]
+        mock_session_instance.exec.return_value.first.return_value = (
+            mock_user_state,
+            None,
+        )
 
         # --- Execute the service method ---
         result = await webhook_service.handle_text(message_data)
@@ -495,21 +482,17 @@ async def test_handle_document_reaches_file_limit(webhook_service):
         mock_session = MagicMock()
         mock_session_class.return_value.__enter__.return_value = mock_session
 
-        # 1. Mock counting documents (user has 10)
-        mock_count_exec = MagicMock()
-        mock_count_exec.one.return_value = 10  # Simulate user is at the limit
+        # 1. Mock the content-hash dedup lookup (no prior upload of these
+        # bytes)
+        mock_dedup_exec = MagicMock()
+        mock_dedup_exec.first.return_value = None
 
-        # 2. Mock finding the oldest document
-        mock_oldest_doc = PDFDocument(
-            id=1,
-            filename="old.pdf",
-            user_id="user_at_limit",
-            upload_date=datetime.now(),
-        )
-        mock_find_oldest_exec = MagicMock()
-        mock_find_oldest_exec.first.return_value = mock_oldest_doc
+        # 2. Mock the cap-enforcement DELETE (one row evicted: user was at
+        # the limit)
+        mock_evict_exec = MagicMock()
+        mock_evict_exec.rowcount = 1
 
-        # 3. Mock getting the new doc after adding (for content update)
+        # 2. Mock getting the new doc after adding (for content update)
         # Use a specific doc_id that would be generated hypothetically
         new_doc_id_hypothetical = 11
         mock_get_new_doc = PDFDocument(
@@ -519,7 +502,7 @@ async def test_handle_document_reaches_file_limit(webhook_service):
             mock_get_new_doc  # Mock the get call inside the loop
         )
 
-        # 4. Mock the UserState exec call inside _set_user_state
+        # 3. Mock the UserState exec call inside _set_user_state
         mock_user_state = UserState(
             user_id="user_at_limit", state="active"
         )  # Existing or new state
@@ -527,24 +510,27 @@ async def test_handle_document_reaches_file_limit(webhook_service):
         mock_get_user_state_exec.first.return_value = mock_user_state
 
         # Set up side effects for session.exec chain
-        # Order: count -> find_oldest -> get_user_state (from _set_user_state)
+        # Order: dedup lookup -> cap-enforcement DELETE -> state upsert
         mock_session.exec.side_effect = [
-            mock_count_exec,
-            mock_find_oldest_exec,
+            mock_dedup_exec,
+            mock_evict_exec,
             mock_get_user_state_exec,
-        ]  # FIX: Add mock for _set_user_state exec call
+        ]
 
         result = await webhook_service.handle_document(message_data)
 
         assert result["status"] == "success"  # Now expecting success
         assert result["type"] == "document"
-        # Verify delete was called on the oldest doc
-        mock_session.delete.assert_called_once_with(mock_oldest_doc)
+        # The overflow rows are removed with a DELETE statement, not
+        # session.delete on a loaded row
+        mock_session.delete.assert_not_called()
         # Verify add was called for the new doc initially and potentially state update
         # It's complex to assert exact add calls due to state updates inside loops/helpers.
         # Focus on delete and overall success.
-        # Verify commit was called multiple times (after delete, after initial add, after content update, after state update)
-        assert mock_session.commit.call_count >= 3
+        # Verify commits: the eviction delete, the placeholder insert
+        # (committed before the slow extract/embed work), then a single one
+        # covering the content update and state upsert together.
+        assert mock_session.commit.call_count == 3
         # Verify process_document was called
         webhook_service.llm_service.process_document.assert_awaited_once()
 
@@ -570,20 +556,11 @@ async def test_handle_text_with_active_pdf(webhook_service):
         mock_session = MagicMock()
         mock_session_class.return_value.__enter__.return_value = mock_session
 
-        # Simulate finding UserState with an active_pdf_id
+        # Simulate the JOINed lookup returning the state with its active PDF
         mock_user_state = UserState(
             user_id="user_with_state", state="active", active_pdf_id=5
         )
-        # Simulate getting the active PDFDocument based on the ID
-        mock_active_pdf = PDFDocument(
-            id=5,
-            user_id="user_with_state",
-            filename="active.pdf",
-            content="some processed content",
-        )
-
-        mock_session.exec.return_value.first.return_value = mock_user_state
-        mock_session.get.return_value = mock_active_pdf
+        mock_session.exec.return_value.first.return_value = (mock_user_state, 5)
 
         result = await webhook_service.handle_text(message_data)
 
@@ -597,8 +574,9 @@ async def test_handle_text_with_active_pdf(webhook_service):
     webhook_service.whatsapp.send_message.assert_called_once_with(
         "user_with_state", "active pdf answer"
     )
-    # Verify session.get was used to retrieve the active PDF
-    mock_session.get.assert_called_once_with(PDFDocument, 5)
+    # State and document come back from the single JOINed query
+    mock_session.exec.assert_called_once()
+    mock_session.get.assert_not_called()
 
 
 @pytest.mark.asyncio
@@ -620,39 +598,18 @@ async def test_handle_text_document_not_processed(webhook_service):
         mock_session = MagicMock()
         mock_session_class.return_value.__enter__.return_value = mock_session
 
-        # Mock UserState lookup (first exec call in handle_text)
-        mock_user_state = UserState(user_id="user_waiting", state="active")
-        mock_exec_find_state = MagicMock()
-        mock_exec_find_state.first.return_value = mock_user_state
-
-        # Simulate finding the latest PDF (second exec call in handle_text)
+        # The JOINed lookup returns the state alongside its active PDF id
+        mock_user_state = UserState(
+            user_id="user_waiting", state="active", active_pdf_id=6
+        )
         mock_latest_pdf = PDFDocument(
             id=6, user_id="user_waiting", filename="latest.pdf", content="Some content"
         )  # Ensure content exists
-        mock_exec_find_pdf = MagicMock()
-        mock_exec_find_pdf.first.return_value = mock_latest_pdf
-
-        # Mock the UserState lookup *inside* _set_user_state (third exec call overall)
-        mock_exec_get_state_in_setter = MagicMock()
-        mock_exec_get_state_in_setter.first.return_value = (
-            mock_user_state  # Return the same state object
+        mock_session.exec.return_value.first.return_value = (
+            mock_user_state,
+            mock_latest_pdf.id,
         )
 
-        # Set up side effects for session.exec
-        # Order: find_state -> find_latest_pdf -> find_state_in_setter
-        mock_session.exec.side_effect = [
-            mock_exec_find_state,
-            mock_exec_find_pdf,
-            mock_exec_get_state_in_setter,
-        ]  # FIX: Add mock for the exec call inside _set_user_state
-
-        # Mock the session.get call inside handle_text for the active PDF check
-        # This happens *before* the latest PDF check if active_pdf_id exists
-        # In this test case, let's assume active_pdf_id *is* set on mock_user_state
-        # and session.get returns the mock_latest_pdf
-        mock_user_state.active_pdf_id = 6
-        mock_session.get.return_value = mock_latest_pdf
-
         # Execute the service method
         result = await webhook_service.handle_text(message_data)
 
@@ -752,11 +709,23 @@ async def test_handle_command_select_delete(
         ]
         mock_exec_chain_find = MagicMock()
         mock_exec_chain_find.all.return_value = mock_pdfs
+        # /delete issues a DELETE statement through session.exec
+        mock_exec_chain_delete = MagicMock()
         # Mock finding no existing user state for _set_user_state
         mock_exec_chain_state = MagicMock()
         mock_exec_chain_state.first.return_value = None
 
-        mock_session.exec.side_effect = [mock_exec_chain_find, mock_exec_chain_state]
+        if command_str.startswith("/delete"):
+            mock_session.exec.side_effect = [
+                mock_exec_chain_find,
+                mock_exec_chain_delete,
+                mock_exec_chain_state,
+            ]
+        else:
+            mock_session.exec.side_effect = [
+                mock_exec_chain_find,
+                mock_exec_chain_state,
+            ]
 
         result = await webhook_service.handle_command(
             command_str, "selector", "Selector"
@@ -769,18 +738,12 @@ async def test_handle_command_select_delete(
 
     # Verify state update/delete
     if command_str.startswith("/delete"):
-        assert mock_session.delete.call_count == 1
-        deleted_pdf_id = (
-            2 if command_str.endswith(" 1") else 1
-        )  # Based on mock_pdfs order
-        assert mock_session.delete.call_args[0][0].id == deleted_pdf_id
-
-    # Verify _set_user_state logic (it should add a new state here)
-    assert mock_session.add.call_count == 1
-    added_state = mock_session.add.call_args[0][0]
-    assert isinstance(added_state, UserState)
-    assert added_state.state == expected_state
-    assert added_state.active_pdf_id == expected_active_id
+        # The row is removed by a DELETE statement, not session.delete
+        assert mock_session.delete.call_count == 0
+        assert mock_session.exec.call_count == 3
+
+    # Verify _set_user_state logic (a single UPSERT statement, no ORM add)
+    assert mock_session.add.call_count == 0
     assert mock_session.commit.call_count == 1
 
 
@@ -802,15 +765,12 @@ async def test_handle_command_delete_all(webhook_service):
         mock_session_instance.__exit__.return_value = None
 
         # Configure instance methods
-        mock_count_exec = MagicMock()
-        mock_count_exec.one.return_value = 5  # Simulate 5 files exist
         mock_delete_exec = MagicMock()
+        mock_delete_exec.rowcount = 5  # Simulate 5 files deleted
         mock_state_exec = MagicMock()
-        mock_state_exec.first.return_value = None
 
         # Set the side effect for the exec calls in order
         mock_session_instance.exec.side_effect = [
-            mock_count_exec,
             mock_delete_exec,
             mock_state_exec,
         ]
@@ -827,11 +787,11 @@ async def test_handle_command_delete_all(webhook_service):
     assert result["command"] == "delete_all"
 
     # --- FIX: Verify calls on the instance ---
-    # Verify count, delete, and state setting happened via exec
-    assert mock_session_instance.exec.call_count == 3
+    # Verify the delete and the state upsert happened via exec
+    assert mock_session_instance.exec.call_count == 2
 
-    # Check state was added/updated by _set_user_state
-    assert mock_session_instance.add.call_count == 1  # For adding new state
+    # Check state was upserted by _set_user_state (second exec call)
+    assert mock_session_instance.add.call_count == 0
     assert (
         mock_session_instance.commit.call_count == 1
     )  # Commit happens inside _set_user_state
@@ -845,27 +805,26 @@ async def test_handle_command_delete_all(webhook_service):
 
 @pytest.mark.asyncio
 async def test_set_user_state_update(webhook_service):
-    """Test _set_user_state when updating an existing state."""
-    user_id = "updater"
-    # Mock database session
-    with patch.object(webhook_service_module, "Session") as mock_session_class:
-        mock_session = MagicMock()
-        mock_session_class.return_value.__enter__.return_value = mock_session
+    """Test _set_user_state upserting against a real database."""
+    from sqlmodel import SQLModel, create_engine, select
 
-        # Simulate finding an existing UserState
-        existing_state = UserState(user_id=user_id, state="active", active_pdf_id=1)
-        mock_exec_chain = MagicMock()
-        mock_exec_chain.first.return_value = existing_state
-        mock_session.exec.return_value = mock_exec_chain
+    user_id = "updater"
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
 
-        # Call the internal method directly for testing
+    with Session(engine) as session:
+        # First call inserts
+        webhook_service._set_user_state(session, user_id, "active", active_pdf_id=1)
+        # Second call updates state but keeps the stored active_pdf_id
         webhook_service._set_user_state(
-            mock_session, user_id, "awaiting_report", active_pdf_id=None
+            session, user_id, "awaiting_report", active_pdf_id=None
         )
 
-    # Verify the existing state was updated and added back
-    assert existing_state.state == "awaiting_report"
-    assert existing_state.active_pdf_id == 1
-    assert mock_session.add.call_count == 1
-    assert mock_session.add.call_args[0][0] == existing_state
-    assert mock_session.commit.call_count == 1
+        rows = session.exec(
+            select(UserState).where(UserState.user_id == user_id)
+        ).all()
+
+    # One row per user, state replaced, active_pdf_id preserved
+    assert len(rows) == 1
+    assert rows[0].state == "awaiting_report"
+    assert rows[0].active_pdf_id == 1